@@ -0,0 +1,157 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import warnings
+import store
+import get_data
+from metrics import METRICS
+from query import index_metric, select_countries, max_year_in_range, ranked_rows
+from charts import category_orders_for, line_figure, bar_figure
+from frames import for_display, kpi_with_delta
+from benchmarks.synthetic import generate_store
+
+# Times each stage of serving the dashboard on synthetic data and appends one
+# JSON record per size to the results file, so runs can be compared across commits.
+#
+# Usage: python -m benchmarks.bench_dashboard --sizes today all --repeat 5
+
+SIZES = {
+    # countries x years x indicators
+    'today': (24, 64, 15),
+    'medium': (100, 60, 25),
+    'all': (265, 60, 37),
+}
+DEFAULT_SELECTION = ['CAN', 'USA']
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, {
+        'median_ms': statistics.median(timings) * 1e3,
+        'min_ms': min(timings) * 1e3,
+        'max_ms': max(timings) * 1e3,
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_size(name, n_countries, n_years, n_indicators, repeat, n_selected, metric):
+    # get_data reads ./data, so run from inside a throwaway directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            _, generation = timed(lambda: generate_store('./data', n_countries, n_years, n_indicators), 1)
+            indicators = sorted(f[:-len('.parquet')] for f in os.listdir('./data') if f.endswith('.parquet'))
+            stages = {'generate': generation}
+
+            _, stages['ingest'] = timed(lambda: [store.read_metric(indicator) for indicator in indicators], repeat)
+
+            registry_metrics = tuple(key for key in METRICS if get_data.is_stored(key, './data'))
+            def transform():
+                get_data.clear_series_cache()
+                return get_data.build_metrics_table(registry_metrics)
+            table, stages['transform'] = timed(transform, repeat)
+
+            spec = METRICS[metric]
+            metric_df = get_data.to_metric_frame(table[table['Metric'] == metric], metric)
+            indexed, stages['index'] = timed(
+                lambda: index_metric(metric_df, rank_by=[spec['name'], spec['kpi_col']]), repeat
+            )
+            countries = metric_df['Country'].drop_duplicates().tolist()
+            selected = (DEFAULT_SELECTION + [c for c in countries if c not in DEFAULT_SELECTION])[:n_selected]
+            from_year, to_year = int(metric_df['Year'].min()), int(metric_df['Year'].max())
+
+            def mask_filter():
+                return metric_df[
+                    (metric_df['Country'].isin(selected))
+                    & (metric_df['Year'] <= to_year)
+                    & (from_year <= metric_df['Year'])
+                ]
+            _, stages['filter_mask'] = timed(mask_filter, repeat)
+            (filtered_df, country_dfs), stages['filter_indexed'] = timed(
+                lambda: select_countries(indexed, sorted(selected), from_year, to_year), repeat
+            )
+
+            def kpis():
+                # the ranking and the st.metric texts create_section_for_metric shows
+                ranked_df = ranked_rows(indexed, max_year_in_range(country_dfs), selected)
+                values = {
+                    country: kpi_with_delta(country_df[spec['kpi_col']], spec['format'], spec['decimals'])
+                    for country, country_df in country_dfs.items()
+                }
+                return ranked_df, values
+            (ranked_df, _), stages['kpi'] = timed(kpis, repeat)
+            (filtered_df, ranked_df), stages['display'] = timed(
+                lambda: (for_display(filtered_df, metric, text=False), for_display(ranked_df, metric)), repeat
+            )
+
+            category_orders = category_orders_for(ranked_df)
+            _, stages['figure_line'] = timed(
+                lambda: line_figure(filtered_df, 'Country', spec['name'], category_orders, spec['tick_format']), repeat
+            )
+            _, stages['figure_bar'] = timed(
+                lambda: bar_figure(
+                    ranked_df, 'Country', spec['name'], category_orders,
+                    text_col=spec['text_col'] or spec['name'], tickformat=spec['tick_format']
+                ),
+                repeat
+            )
+            rows = int(sum(len(store.read_metric(indicator)) for indicator in indicators))
+        finally:
+            os.chdir(cwd)
+    return {
+        'size': name,
+        'countries': n_countries,
+        'years': n_years,
+        'indicators': n_indicators,
+        'rows': rows,
+        'metric': metric,
+        'selected_countries': len(selected),
+        'repeat': repeat,
+        'stages': stages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard data path on synthetic World Bank data.')
+    parser.add_argument('--sizes', nargs='+', default=['today', 'all'], help=f'presets: {", ".join(SIZES)}')
+    parser.add_argument('--shape', type=int, nargs=3, metavar=('COUNTRIES', 'YEARS', 'INDICATORS'),
+                        help='a custom size instead of the presets')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--selected', type=int, default=20, help='countries selected in the multiselect')
+    parser.add_argument('--metric', default='gdp')
+    parser.add_argument('--output', default='benchmarks/results.jsonl')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    # tiny synthetic values round to a zero KPI, the divide warnings are just noise here
+    warnings.filterwarnings('ignore', category=RuntimeWarning)
+
+    sizes = {'custom': tuple(args.shape)} if args.shape else {name: SIZES[name] for name in args.sizes}
+    run = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+    output = os.path.abspath(args.output)
+    for name, (n_countries, n_years, n_indicators) in sizes.items():
+        result = {**run, **run_size(name, n_countries, n_years, n_indicators, args.repeat, args.selected, args.metric)}
+        with open(output, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f'{name}: {n_countries} countries x {n_years} years x {n_indicators} indicators ({result["rows"]:,} rows)')
+        for stage, timing in result['stages'].items():
+            print(f'  {stage:<15} {timing["median_ms"]:>10.2f} ms')
+    print(f'Results appended to {args.output}')
+
+if __name__ == '__main__':
+    main()
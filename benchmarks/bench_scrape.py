@@ -0,0 +1,87 @@
+import argparse
+import tempfile
+import time
+import logging
+from constants import CORE_URLS_PER_COUNTRY, CORE_URLS_ALL_COUNTRIES, CORE_COUNTRIES_TO_SCRAPE_INITIALLY
+import store
+from scrape import scrape_core_metrics_for_core_countries, scrape_core_metrics_for_all_countries
+from benchmarks.worldbank_stub import start_stub_server, stub_base_url, point_urls_at
+
+# Usage: python -m benchmarks.bench_scrape --latency 0.05 --concurrency 1 8 16 --bulk --replay
+#        python -m benchmarks.bench_scrape --throttle-rate 0.05 --error-rate 0.05
+
+def time_scrape(urls, concurrency, data_dir, transport='live', cassette_dir=None):
+    start = time.perf_counter()
+    scrape_core_metrics_for_core_countries(
+        concurrency=concurrency,
+        urls=urls,
+        countries=CORE_COUNTRIES_TO_SCRAPE_INITIALLY,
+        data_dir=data_dir,
+        transport=transport,
+        cassette_dir=cassette_dir,
+    )
+    return time.perf_counter() - start
+
+def time_bulk_scrape(urls, concurrency, data_dir):
+    start = time.perf_counter()
+    scrape_core_metrics_for_all_countries(
+        concurrency=concurrency,
+        urls=urls,
+        countries=CORE_COUNTRIES_TO_SCRAPE_INITIALLY,
+        data_dir=data_dir,
+    )
+    return time.perf_counter() - start
+
+def same_output(left_dir, right_dir):
+    for metric in CORE_URLS_PER_COUNTRY:
+        left = store.read_metric(metric, data_dir=left_dir)
+        right = store.read_metric(metric, data_dir=right_dir)
+        key = ['countryiso3code', 'date']
+        if not left.sort_values(key, ignore_index=True).equals(right.sort_values(key, ignore_index=True)):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraper against a local World Bank stub.')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds of latency per request')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 16])
+    parser.add_argument('--bulk', action='store_true', help='also time the all-countries bulk path')
+    parser.add_argument('--replay', action='store_true', help='record the first run and time replaying it from disk')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of stub requests answered with a 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of stub requests answered with a 5xx')
+    args = parser.parse_args()
+    logging.getLogger('scrape').setLevel(logging.WARNING)
+    logging.getLogger('transport').setLevel(logging.WARNING)
+
+    server = start_stub_server(latency=args.latency, throttle_rate=args.throttle_rate, error_rate=args.error_rate)
+    urls = point_urls_at(CORE_URLS_PER_COUNTRY, stub_base_url(server))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, concurrency in enumerate(args.concurrency):
+            before = server.request_count
+            record = args.replay and i == 0
+            seconds = time_scrape(
+                urls, concurrency, f'{tmp}/c{concurrency}',
+                transport='record' if record else 'live', cassette_dir=f'{tmp}/cassettes'
+            )
+            results[f'c{concurrency}'] = (f'{concurrency} workers', seconds, server.request_count - before)
+        if args.replay:
+            before = server.request_count
+            seconds = time_scrape(urls, max(args.concurrency), f'{tmp}/replay', 'replay', f'{tmp}/cassettes')
+            results['replay'] = ('replay', seconds, server.request_count - before)
+        if args.bulk:
+            bulk_urls = point_urls_at(CORE_URLS_ALL_COUNTRIES, stub_base_url(server))
+            before = server.request_count
+            seconds = time_bulk_scrape(bulk_urls, max(args.concurrency), f'{tmp}/bulk')
+            results['bulk'] = ('bulk', seconds, server.request_count - before)
+        baseline = f'c{args.concurrency[0]}'
+        print(f'{"mode":>12} {"seconds":>9} {"requests":>9} {"speedup":>8} {"same files":>11}')
+        for key, (label, seconds, requests_made) in results.items():
+            identical = same_output(f'{tmp}/{baseline}', f'{tmp}/{key}')
+            print(f'{label:>12} {seconds:>9.2f} {requests_made:>9} {results[baseline][1] / seconds:>7.1f}x {str(identical):>11}')
+    if server.fault_count:
+        print(f'Injected faults: {dict(sorted(server.fault_count.items()))}')
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
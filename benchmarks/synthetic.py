@@ -0,0 +1,55 @@
+import string
+import numpy as np
+import pandas as pd
+import store
+from constants import COUNTRY_CODES_W_FLAGS, CORE_URLS_PER_COUNTRY, EXTRA_URLS_PER_COUNTRY
+
+# Synthetic World Bank data in the same shape the scraper writes, so loaders,
+# filters and charts can be timed at sizes we don't have real data for yet.
+
+INDICATORS = list(dict.fromkeys([*CORE_URLS_PER_COUNTRY, *EXTRA_URLS_PER_COUNTRY]))
+
+def synthetic_countries(n_countries):
+    # real codes first so flags and the default CAN/USA selection still resolve
+    countries = list(dict.fromkeys(COUNTRY_CODES_W_FLAGS))[:n_countries]
+    letters = string.ascii_uppercase
+    for a in letters:
+        for b in letters:
+            for c in letters:
+                if len(countries) >= n_countries:
+                    return countries
+                code = f'{a}{b}{c}'
+                if code not in COUNTRY_CODES_W_FLAGS:
+                    countries.append(code)
+    return countries
+
+def synthetic_indicators(n_indicators):
+    indicators = INDICATORS[:n_indicators]
+    indicators += [f'indicator_{i}' for i in range(len(indicators), n_indicators)]
+    return indicators
+
+def synthetic_series(countries, years, seed=0, missing=0.05):
+    # a random walk per country around a country-specific level, with gaps
+    rng = np.random.default_rng(seed)
+    n_countries, n_years = len(countries), len(years)
+    level = rng.lognormal(mean=rng.uniform(0, 25), sigma=1.5, size=(n_countries, 1))
+    growth = 1 + rng.normal(0.02, 0.04, size=(n_countries, n_years))
+    values = level * np.cumprod(growth, axis=1)
+    values[rng.random((n_countries, n_years)) < missing] = np.nan
+    return pd.DataFrame({
+        'countryiso3code': np.repeat(countries, n_years),
+        'date': np.tile(years[::-1], n_countries).astype(str),
+        'value': values[:, ::-1].ravel(),
+    })
+
+def generate_store(data_dir, n_countries=24, n_years=64, n_indicators=15, last_year=2023, backend='parquet', seed=0):
+    countries = synthetic_countries(n_countries)
+    years = np.arange(last_year - n_years + 1, last_year + 1)
+    indicators = synthetic_indicators(n_indicators)
+    for i, indicator in enumerate(indicators):
+        df = synthetic_series(countries, years, seed=seed + i)
+        if backend == 'parquet':
+            store.write_parquet(indicator, df, data_dir)
+        else:
+            store.write_series(indicator, dict(tuple(df.groupby('countryiso3code', sort=False))), data_dir, backend)
+    return {'countries': countries, 'years': years.tolist(), 'indicators': indicators}
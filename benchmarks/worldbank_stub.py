@@ -0,0 +1,140 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from constants import COUNTRY_CODES_W_FLAGS
+
+# Serves World Bank shaped `[meta, rows]` pages so the scraper can be exercised
+# without api.worldbank.org, optionally slow and flaky on purpose.
+#
+# Usage: python -m benchmarks.worldbank_stub --port 8000 --latency 0.05 --throttle-rate 0.1 --error-rate 0.05
+#        WORLDBANK_BASE_URL=http://127.0.0.1:8000 python scrape.py
+INDICATOR_PATH = re.compile(r'^/v2/countries/(?P<country>[^/]+)/indicators?/(?P<indicator>[^/]+)$')
+FIRST_YEAR = 1960
+LAST_YEAR = 2023
+ALL_COUNTRIES = list(dict.fromkeys(COUNTRY_CODES_W_FLAGS))
+
+def make_rows(country, indicator):
+    rows = []
+    for year in range(LAST_YEAR, FIRST_YEAR - 1, -1):
+        rows.append({
+            'indicator': {'id': indicator, 'value': indicator},
+            'country': {'id': country[:2], 'value': country},
+            'countryiso3code': country,
+            'date': str(year),
+            'value': float(sum(map(ord, country + indicator)) * (year - FIRST_YEAR + 1)),
+            'unit': '',
+            'obs_status': '',
+            'decimal': 0,
+        })
+    return rows
+
+class WorldBankStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        match = INDICATOR_PATH.match(parsed.path)
+        if match is None:
+            self.send_error(404)
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.request_count += 1
+            roll = self.server.random.random()
+            server_error = self.server.random.choice([500, 502, 503])
+        if roll < self.server.throttle_rate:
+            self.send_fault(429, {'Retry-After': str(self.server.retry_after)})
+            return
+        if roll < self.server.throttle_rate + self.server.error_rate:
+            self.send_fault(server_error)
+            return
+        params = parse_qs(parsed.query)
+        page = int(params.get('page', ['1'])[0])
+        per_page = int(params.get('per_page', ['50'])[0])
+        if match['country'] == 'all':
+            rows = [row for country in ALL_COUNTRIES for row in make_rows(country, match['indicator'])]
+        else:
+            rows = make_rows(match['country'], match['indicator'])
+        pages = max(1, math.ceil(len(rows) / per_page))
+        meta = {
+            'page': page,
+            'pages': pages,
+            'per_page': per_page,
+            'total': len(rows),
+            'sourceid': '2',
+            'lastupdated': '2024-03-28',
+        }
+        body = json.dumps([meta, rows[(page - 1) * per_page:page * per_page]]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_fault(self, status, headers=None):
+        with self.server.lock:
+            self.server.fault_count[status] = self.server.fault_count.get(status, 0) + 1
+        body = b'{"message": "injected fault"}'
+        self.send_response(status)
+        for key, val in (headers or {}).items():
+            self.send_header(key, val)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(latency=0.05, host='127.0.0.1', port=0, throttle_rate=0.0, error_rate=0.0, retry_after=1, seed=0):
+    # throttle_rate / error_rate are the share of requests answered with a 429
+    # (carrying Retry-After) or a 5xx instead of data, drawn from a seeded rng
+    server = ThreadingHTTPServer((host, port), WorldBankStubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.throttle_rate = throttle_rate
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.random = random.Random(seed)
+    server.request_count = 0
+    server.fault_count = {}
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def stub_base_url(server):
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}'
+
+def point_urls_at(urls, base_url):
+    return {
+        key: re.sub(r'^https?://api\.worldbank\.org', base_url, val)
+        for key, val in urls.items()
+    }
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the World Bank indicators API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds of latency per request')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of requests answered with a 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 5xx')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with each 429')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    server = start_stub_server(
+        args.latency, args.host, args.port, args.throttle_rate, args.error_rate, args.retry_after, args.seed
+    )
+    print(f'World Bank stub listening on {stub_base_url(server)}, Ctrl+C to stop')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,107 @@
+import io
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+from functools import partial
+import numpy as np
+import pandas as pd
+from constants import CORE_URLS_PER_COUNTRY, EXTRA_URLS_PER_COUNTRY, CORE_COUNTRIES_TO_SCRAPE_INITIALLY
+import store
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# Imports World Bank bulk downloads (one row per economy, one column per year)
+# into the store, e.g. ./data/gdp_data.csv or an API_NY.GDP.MKTP.CD_DS2_en_csv_v2.zip
+# from data.worldbank.org. Every economy for a metric comes from one file read.
+#
+# The command line imports into a new data version and publishes it, like a
+# refresh does.
+#
+# Usage: python bulk_import.py data/gdp_data.csv data/population_data.csv
+
+# World Bank indicator code -> store metric, read off the scraper's urls
+INDICATOR_METRICS = {
+    re.search(r'/indicators?/([^/?]+)', url).group(1): metric
+    for metric, url in {**EXTRA_URLS_PER_COUNTRY, **CORE_URLS_PER_COUNTRY}.items()
+}
+HEADER_START = '"Country Name"'
+
+@contextmanager
+def open_zip_member(path, name):
+    with zipfile.ZipFile(path) as zf, zf.open(name) as member:
+        yield io.TextIOWrapper(member, encoding='utf-8-sig')
+
+def iter_bulk_csvs(path):
+    # (name, opener) for a csv, or for each data csv inside a bulk zip package
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            members = [
+                name for name in zf.namelist()
+                if name.endswith('.csv') and not os.path.basename(name).startswith('Metadata_')
+            ]
+        for name in members:
+            yield f'{path}:{name}', partial(open_zip_member, path, name)
+    else:
+        yield path, lambda: open(path, encoding='utf-8-sig')
+
+def header_row(open_csv, max_lines=20):
+    # the zipped packages start with a few "Data Source" / "Last Updated" lines
+    with open_csv() as f:
+        for i, line in enumerate(f):
+            if line.startswith(HEADER_START):
+                return i
+            if i >= max_lines:
+                break
+    raise ValueError(f'No {HEADER_START} header in the first {max_lines} lines')
+
+def read_wide_csv(open_csv) -> pd.DataFrame:
+    skiprows = header_row(open_csv)
+    with open_csv() as f:
+        wide = pd.read_csv(f, skiprows=skiprows)
+    # every row ends in a trailing comma, which reads as an empty unnamed column
+    return wide.loc[:, ~wide.columns.str.startswith('Unnamed')]
+
+def melt_wide(wide: pd.DataFrame) -> pd.DataFrame:
+    # one reshape of the whole year block instead of a row-by-row melt
+    years = [col for col in wide.columns if col.isdigit()]
+    values = wide[years].to_numpy(dtype='float64')
+    long_df = pd.DataFrame({
+        'indicator': np.repeat(wide['Indicator Code'].to_numpy(), len(years)),
+        'countryiso3code': np.repeat(wide['Country Code'].to_numpy(), len(years)),
+        'date': np.tile(np.array(years, dtype='int16'), len(wide)),
+        'value': values.ravel(),
+    })
+    return long_df[~np.isnan(values.ravel())]
+
+def import_bulk(paths, data_dir='./data', countries=None):
+    imported = {}
+    for path in paths:
+        for name, open_csv in iter_bulk_csvs(path):
+            logger.info(f'Importing {name} 📦...')
+            long_df = melt_wide(read_wide_csv(open_csv))
+            if countries is not None:
+                long_df = long_df[long_df['countryiso3code'].isin(countries)]
+            for indicator, indicator_df in long_df.groupby('indicator', sort=False):
+                metric = INDICATOR_METRICS.get(indicator)
+                if metric is None:
+                    logger.info(f'No metric scrapes {indicator}, skipping ⏭️')
+                    continue
+                frames = dict(tuple(indicator_df.groupby('countryiso3code', sort=False)))
+                store.write_series(metric, frames, data_dir)
+                imported[metric] = imported.get(metric, 0) + len(frames)
+    logger.info(f'Imported {sum(imported.values())} series for {len(imported)} metrics ✅')
+    return imported
+
+if __name__ == '__main__':
+    import argparse
+    import refresh
+    parser = argparse.ArgumentParser(description='Import World Bank bulk csv / zip downloads into a new data version')
+    parser.add_argument('paths', nargs='+', help='wide-format csv files or the zip packages they come in')
+    parser.add_argument('--root', default='./data')
+    parser.add_argument('--core-countries', action='store_true', help='only keep the countries the scraper fetches')
+    args = parser.parse_args()
+    countries = CORE_COUNTRIES_TO_SCRAPE_INITIALLY if args.core_countries else None
+    refresh.write_new_version(lambda data_dir: import_bulk(args.paths, data_dir, countries), args.root)
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from constants import EXTRA_URLS_PER_COUNTRY
+from metrics import METRICS
+import store
+from scrape import scrape_core_metrics_for_core_countries
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# The on-demand half of the metrics registry. Every indicator is listed in the
+# app, but one of these is only scraped (for the core countries) the first time
+# somebody opens it. The scrape goes into a new data version, published like a
+# refresh, so from then on it's read from disk, copied into each new version
+# and kept up to date by refresh.py.
+CATALOG_FETCH_TIMEOUT = config('CATALOG_FETCH_TIMEOUT', default=300.0, cast=float)  # seconds
+# don't ask the World Bank again for an indicator it had nothing for
+CATALOG_RETRY_MINUTES = config('CATALOG_RETRY_MINUTES', default=60.0, cast=float)
+
+ON_DEMAND_URLS = {
+    spec['folder']: EXTRA_URLS_PER_COUNTRY[key]
+    for key, spec in METRICS.items()
+    if spec.get('on_demand')
+}
+
+# (folder, data dir) -> fetch in flight, so concurrent first requests share one
+_fetches = {}
+_empty_since = {}
+_fetch_lock = threading.Lock()
+
+def is_on_demand(folder):
+    return folder in ON_DEMAND_URLS
+
+def fetched_urls(data_dir):
+    # the on-demand metrics somebody has opened, refreshed along with the core ones
+    return {folder: url for folder, url in ON_DEMAND_URLS.items() if store.metric_exists(folder, data_dir)}
+
+def wait_for_lock(lock, deadline):
+    # a refresh (or another process's fetch) is publishing a version, wait for it
+    while os.path.exists(lock) and time.time() < deadline:
+        time.sleep(0.5)
+
+def scrape_on_demand(folder, data_dir):
+    # (data dir, answered): the published data dir the metric is in now (None
+    # if it isn't anywhere), and whether the World Bank actually answered every
+    # request (an empty answer is remembered)
+    import refresh  # refresh imports this module
+    root = store.data_root(data_dir)
+    lock = refresh.refresh_lock_path(root)
+    answered = []
+
+    def scrape(staging_dir):
+        logger.info(f'Fetching {folder} for the first time 🛰️')
+        failures = scrape_core_metrics_for_core_countries(urls={folder: ON_DEMAND_URLS[folder]}, data_dir=staging_dir)
+        answered.append(not failures)
+
+    deadline = time.time() + CATALOG_FETCH_TIMEOUT
+    while not answered and time.time() < deadline:
+        wait_for_lock(lock, deadline)
+        live_dir = store.live_data_dir(root)
+        if store.metric_exists(folder, live_dir):
+            # it landed while we were waiting
+            return live_dir, True
+        refresh.write_new_version(scrape, root)
+    live_dir = store.live_data_dir(root)
+    return (live_dir if store.metric_exists(folder, live_dir) else None), any(answered)
+
+def fetch_on_demand(folder, data_dir):
+    # the data dir to read the metric from once it's fetched, None if there's nothing to show
+    key = (folder, data_dir)
+    with _fetch_lock:
+        if time.time() - _empty_since.get(key, -float('inf')) < CATALOG_RETRY_MINUTES * 60:
+            return None
+        future = _fetches.get(key)
+        owner = future is None
+        if owner:
+            future = _fetches[key] = Future()
+    if owner:
+        answered = False
+        try:
+            fetched_dir, answered = scrape_on_demand(folder, data_dir)
+            future.set_result(fetched_dir)
+        except Exception as err:
+            future.set_exception(err)
+        with _fetch_lock:
+            _fetches.pop(key, None)
+            if answered and future.result() is None:
+                _empty_since[key] = time.time()
+    return future.result()
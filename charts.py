@@ -0,0 +1,78 @@
+import pandas as pd
+from plotly import express as px
+import plotly.io as pio
+
+# Figure builders for a metric section, kept free of Streamlit calls so they
+# can also be used outside the app (benchmarks, exports).
+
+def category_orders_for(ranked_df, var_to_group_by_col='Country'):
+    category_order = ['CAN 🇨🇦'] + [ # put Canada first
+        val for val in
+        ranked_df[var_to_group_by_col].tolist()
+        if val != 'CAN 🇨🇦'
+    ]
+    return {
+        var_to_group_by_col: category_order
+    }
+
+def line_figure(metric_df, var_to_group_by_col, metric_col, category_orders, tickformat=None):
+    p = px.line(
+        metric_df,
+        x='Year',
+        y=metric_col,
+        color=var_to_group_by_col,
+        title=f'Yearly {metric_col} by {var_to_group_by_col}',
+        category_orders=category_orders,
+        hover_data=['Year', metric_col, var_to_group_by_col]
+    )
+    p.update_yaxes(tickformat=tickformat)
+    return p
+
+def bar_figure(ranked_df, var_to_group_by_col, metric_col, category_orders, text_col=None, tickformat=None):
+    max_year = ranked_df['Year'].max()
+    p = px.bar(
+        ranked_df,
+        y=var_to_group_by_col,
+        x=metric_col,
+        orientation='h',
+        title=f'{metric_col} by {var_to_group_by_col} (Year = {int(max_year)})',
+        hover_data={text_col: False, var_to_group_by_col: True, metric_col: True},
+        category_orders=category_orders,
+        text=text_col
+    )
+    p.update_xaxes(tickformat=tickformat)
+    return p
+
+def pie_figure(ranked_df, var_to_group_by_col, metric_col, category_orders, text_col=None):
+    max_year = ranked_df['Year'].max()
+    return px.pie(
+        ranked_df,
+        names=var_to_group_by_col,
+        values=metric_col,
+        title=f'{metric_col} by {var_to_group_by_col} (Year = {int(max_year)})',
+        hole=0.4,
+        category_orders=category_orders,
+        hover_data={text_col: False, var_to_group_by_col: True, metric_col: True},
+    )
+
+def scatter_figure(scatter_df, x_col, y_col, category_orders, x_tickformat=None, y_tickformat=None):
+    p = px.scatter(
+        scatter_df,
+        x=x_col,
+        y=y_col,
+        color='Country',
+        title=f'{y_col} vs {x_col}',
+        category_orders=category_orders,
+        hover_data=['Year', 'Country', x_col, y_col]
+    )
+    p.update_xaxes(tickformat=x_tickformat)
+    p.update_yaxes(tickformat=y_tickformat)
+    return p
+
+def warm_up():
+    # plotly loads its templates and validators on first use, which is most of
+    # the first figure's build time, so pay for it before the first visitor
+    df = pd.DataFrame({'Country': ['CAN 🇨🇦', 'USA 🇺🇸'], 'Year': [2023, 2023], 'Value': [1.0, 2.0]})
+    category_orders = category_orders_for(df)
+    for figure in (line_figure(df, 'Country', 'Value', category_orders), bar_figure(df, 'Country', 'Value', category_orders)):
+        pio.from_json(pio.to_json(figure))
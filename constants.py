@@ -44,16 +44,20 @@ EXTRA_URLS_PER_COUNTRY = {
     'food_production_index': 'http://api.worldbank.org/v2/countries/{country}/indicator/AG.PRD.FOOD.XD?format=json'
 }
 
+# the API's "every economy" selector is the literal country code `all`
 CORE_URLS_ALL_COUNTRIES = {
-    key: val.replace('/{country}', '')
+    key: val.replace('{country}', 'all')
     for key, val in CORE_URLS_PER_COUNTRY.items()
 }
 
 EXTRA_URLS_ALL_COUNTRIES = {
-    key: val.replace('/{country}', '')
+    key: val.replace('{country}', 'all')
     for key, val in EXTRA_URLS_PER_COUNTRY.items()
 }
 
+# what the Select Countries box starts on, and what export.py pre-renders
+DEFAULT_COUNTRIES = ['CAN', 'USA']
+
 CORE_COUNTRIES_TO_SCRAPE_INITIALLY = [
     'CAN',
     'USA',
@@ -80,6 +84,40 @@ CORE_COUNTRIES_TO_SCRAPE_INITIALLY = [
     'IRL',
 ]
 
+# Peer groups, selectable next to the countries. Their series are computed
+# from the members' (see groups.py), so every member gets scraped too.
+COUNTRY_GROUPS = {
+    'G7': ['CAN', 'USA', 'GBR', 'FRA', 'DEU', 'ITA', 'JPN'],
+    'G20': [
+        'ARG', 'AUS', 'BRA', 'CAN', 'CHN', 'FRA', 'DEU', 'IND', 'IDN', 'ITA',
+        'JPN', 'KOR', 'MEX', 'RUS', 'SAU', 'ZAF', 'TUR', 'GBR', 'USA',
+    ],
+    'OECD': [
+        'AUS', 'AUT', 'BEL', 'CAN', 'CHL', 'COL', 'CRI', 'CZE', 'DNK', 'EST',
+        'FIN', 'FRA', 'DEU', 'GRC', 'HUN', 'ISL', 'IRL', 'ISR', 'ITA', 'JPN',
+        'KOR', 'LVA', 'LTU', 'LUX', 'MEX', 'NLD', 'NZL', 'NOR', 'POL', 'PRT',
+        'SVK', 'SVN', 'ESP', 'SWE', 'CHE', 'TUR', 'GBR', 'USA',
+    ],
+    'EU': [
+        'AUT', 'BEL', 'BGR', 'HRV', 'CYP', 'CZE', 'DNK', 'EST', 'FIN', 'FRA',
+        'DEU', 'GRC', 'HUN', 'IRL', 'ITA', 'LVA', 'LTU', 'LUX', 'MLT', 'NLD',
+        'POL', 'PRT', 'ROU', 'SVK', 'SVN', 'ESP', 'SWE',
+    ],
+    'NORDICS': ['DNK', 'FIN', 'ISL', 'NOR', 'SWE'],
+}
+
+COUNTRY_GROUP_LABELS = {
+    'G7': 'G7 🌐',
+    'G20': 'G20 🌐',
+    'OECD': 'OECD 🏛️',
+    'EU': 'EU 🇪🇺',
+    'NORDICS': 'Nordics ❄️',
+}
+
+CORE_COUNTRIES_TO_SCRAPE_INITIALLY = list(dict.fromkeys(
+    CORE_COUNTRIES_TO_SCRAPE_INITIALLY + [country for members in COUNTRY_GROUPS.values() for country in members]
+))
+
 COUNTRY_CODES_W_FLAGS = {
     'CAN': 'CAN 🇨🇦',
     'USA': 'USA 🇺🇸',
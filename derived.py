@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Derived metrics are computed on a dense (country x year) grid: every input
+# series is scattered into the same 2-D array, so a lag is a shift along the
+# year axis and a ratio is element-wise division, no joins on (Country, Year).
+
+def to_grid(*series):
+    codes, countries = pd.factorize(pd.concat([df['Country'] for df in series], ignore_index=True))
+    first_year = int(min(df['Year'].min() for df in series))
+    last_year = int(max(df['Year'].max() for df in series))
+    years = np.arange(first_year, last_year + 1)
+    grids = []
+    offset = 0
+    for df in series:
+        grid = np.full((len(countries), len(years)), np.nan)
+        rows = codes[offset:offset + len(df)]
+        grid[rows, df['Year'].to_numpy(dtype=int) - first_year] = df['Value'].to_numpy(dtype=float)
+        grids.append(grid)
+        offset += len(df)
+    return countries, years, grids
+
+def from_grid(countries, years, grid):
+    rows, cols = np.nonzero(np.isfinite(grid))
+    return pd.DataFrame({
+        'Country': np.asarray(countries)[rows],
+        'Year': years[cols],
+        'Value': grid[rows, cols],
+    })
+
+def lag(grid, years):
+    lagged = np.full_like(grid, np.nan)
+    if years < grid.shape[1]:
+        lagged[:, years:] = grid[:, :-years]
+    return lagged
+
+def yoy_growth(grid):
+    return 100 * ((grid / lag(grid, 1)) - 1)
+
+def cagr(grid, years=5):
+    with np.errstate(invalid='ignore'):
+        return 100 * (np.power(grid / lag(grid, years), 1 / years) - 1)
+
+def ratio(numerator, denominator, multiplier=1):
+    return multiplier * numerator / denominator
+
+def rolling_mean(grid, window=5, min_periods=None):
+    # rows are countries, so roll down the columns of the transpose
+    return pd.DataFrame(grid.T).rolling(window, min_periods=min_periods or window).mean().to_numpy().T
+
+DERIVATIONS = {
+    'yoy_growth': yoy_growth,
+    'cagr': cagr,
+    'ratio': ratio,
+    'rolling_mean': rolling_mean,
+}
+
+def derive_series(derive, inputs, params=None):
+    countries, years, grids = to_grid(*inputs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grid = DERIVATIONS[derive](*grids, **(params or {}))
+    return from_grid(countries, years, grid)
@@ -0,0 +1,217 @@
+import datetime
+import html
+import json
+import os
+import plotly.io as pio
+from plotly.offline import get_plotlyjs_version
+from constants import DEFAULT_COUNTRIES
+from metrics import METRICS, METRICS_BY_LABEL
+import get_data
+import store
+from query import index_metric, select_countries, max_year_in_range, ranked_rows
+from charts import category_orders_for, line_figure, bar_figure
+from frames import country_label, for_display, kpi_with_delta
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# Pre-renders the view most visitors never change: every metric in the Metric
+# selectbox for DEFAULT_COUNTRIES over the full year range, i.e. what
+# create_section_for_metric shows on a fresh page load (KPIs with their deltas
+# and both figures). Writes a static page and a JSON file per metric, so a CDN
+# or any file server can answer the default view and only customised views
+# reach the Streamlit app.
+#
+#   <out>/index.html          the default metric's page
+#   <out>/<metric>.html       one page per metric, the figures drawn by plotly.js
+#   <out>/<metric>.json       the same section as data: KPIs and Plotly figure specs
+#   <out>/index.json          what was exported and from which data versions
+#
+# Only metrics whose data version changed since the last export are rendered
+# again, so it's cheap to run after every refresh. Catalog metrics nobody has
+# fetched yet are skipped (their menu entry links to the app).
+#
+# Usage: python export.py --out ./export
+EXPORT_APP_URL = config('EXPORT_APP_URL', default='https://canada.streamlit.app/')
+# bump when the page or JSON layout changes, so every metric is rendered again
+EXPORT_FORMAT_VERSION = 1
+MANIFEST_FILE = 'index.json'
+
+DELTA_COLORS = {
+    # st.metric's colours for a rise / a fall
+    'normal': ('up', 'down'),
+    'inverse': ('down', 'up'),
+    'off': ('off', 'off'),
+}
+
+PAGE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Canada Dashboard · {title}</title>
+<script src="https://cdn.plot.ly/plotly-{plotly_js_version}.min.js" charset="utf-8"></script>
+<style>
+body {{ font-family: "Source Sans Pro", sans-serif; margin: 2rem auto; max-width: 1200px; padding: 0 1rem; color: #31333f; }}
+h2 {{ border-bottom: 2px solid #e6e6e6; padding-bottom: .5rem; }}
+.caption {{ color: #808495; font-size: .9rem; }}
+.kpis {{ display: flex; gap: 1rem; }}
+.kpi {{ flex: 1; }}
+.kpi-label {{ font-size: .9rem; }}
+.kpi-value {{ font-size: 2.25rem; }}
+.up {{ color: #09ab3b; }} .down {{ color: #ff2b2b; }} .off {{ color: #808495; }}
+.charts {{ display: grid; grid-template-columns: 1fr 1fr; gap: 1rem; }}
+</style>
+</head>
+<body>
+<h1>Canada 🍁 Dashboard</h1>
+<p class="caption">This dashboard compares key economic indicators for Canada against other global superpowers.</p>
+<p><label>Metric <select onchange="location.href = this.value">{options}</select></label></p>
+<p class="caption">{countries}, {from_year}–{to_year} · <a href="{app_url}">Pick other countries or years</a></p>
+<h2>{section_title}</h2>
+<div class="kpis">{kpis}</div>
+<div class="charts"><div id="line"></div><div id="bar"></div></div>
+<p class="caption">Data from the <a href="https://data.worldbank.org/">World Bank Open Data</a> API.</p>
+<script>
+const figures = {figures};
+for (const chart of ['line', 'bar']) {{
+  Plotly.newPlot(chart, figures[chart].data, figures[chart].layout, {{responsive: true}});
+}}
+</script>
+</body>
+</html>
+'''
+
+def default_year_range(data_dir):
+    # the app's year slider starts on the full range of the GDP data
+    years = get_data.load_metric_frame('gdp', data_dir)['Year']
+    return int(years.min()), int(years.max())
+
+def export_section(metric, data_dir, countries, from_year, to_year):
+    # the same steps as create_section_for_metric in streamlit_app.py
+    spec = METRICS[metric]
+    version = get_data.metric_data_version(metric, data_dir)
+    indexed_metric = index_metric(
+        get_data.load_metric_frame(metric, data_dir), rank_by=[spec['name'], spec['kpi_col']], version=version
+    )
+    filtered_metric_df, country_dfs = select_countries(indexed_metric, sorted(countries), from_year, to_year)
+    max_year_filtered_df = ranked_rows(indexed_metric, max_year_in_range(country_dfs), countries)
+    kpi_countries = ['CAN'] + [val for val in max_year_filtered_df['Country'] if val != 'CAN']
+    kpis = []
+    for country in kpi_countries:
+        if not len(country_dfs.get(country, [])):
+            continue
+        value, delta = kpi_with_delta(country_dfs[country][spec['kpi_col']], spec['format'], spec['decimals'])
+        kpis.append({'country': country, 'label': country_label(country), 'value': value, 'delta': delta})
+
+    filtered_metric_df = for_display(filtered_metric_df, metric, text=False)
+    max_year_filtered_df = for_display(max_year_filtered_df, metric)
+    category_orders = category_orders_for(max_year_filtered_df, 'Country')
+    figures = {
+        'line': line_figure(filtered_metric_df, 'Country', spec['name'], category_orders, tickformat=spec['tick_format']),
+        'bar': bar_figure(
+            max_year_filtered_df, 'Country', spec['name'], category_orders,
+            text_col=spec['text_col'] or spec['name'], tickformat=spec['tick_format']
+        ),
+    }
+    return {
+        'metric': metric,
+        'label': spec['label'],
+        'section_title': spec['section_title'],
+        'countries': list(countries),
+        'from_year': from_year,
+        'to_year': to_year,
+        'version': version,
+        'delta_color': spec['delta_color'],
+        'kpis': kpis,
+        'figures': {chart: json.loads(pio.to_json(figure, validate=False)) for chart, figure in figures.items()},
+    }
+
+def kpi_html(kpi, delta_color):
+    delta = ''
+    if kpi['delta'] is not None:
+        rise, fall = DELTA_COLORS[delta_color]
+        falling = kpi['delta'].startswith('-')
+        arrow = '↓' if falling else '↑'
+        delta = f'<div class="{fall if falling else rise}">{arrow} {html.escape(kpi["delta"])}</div>'
+    return (
+        f'<div class="kpi"><div class="kpi-label">{html.escape(kpi["label"])}</div>'
+        f'<div class="kpi-value">{html.escape(kpi["value"])}</div>{delta}</div>'
+    )
+
+def render_page(section, exported):
+    options = ''.join(
+        f'<option value="{html.escape(f"{metric}.html" if metric in exported else EXPORT_APP_URL)}"'
+        f'{" selected" if metric == section["metric"] else ""}>{html.escape(label)}</option>'
+        for label, metric in METRICS_BY_LABEL.items()
+    )
+    return PAGE.format(
+        title=html.escape(section['label']),
+        plotly_js_version=get_plotlyjs_version(),
+        options=options,
+        countries=html.escape(', '.join(country_label(country) for country in section['countries'])),
+        from_year=section['from_year'],
+        to_year=section['to_year'],
+        app_url=html.escape(EXPORT_APP_URL),
+        section_title=html.escape(section['section_title']),
+        kpis=''.join(kpi_html(kpi, section['delta_color']) for kpi in section['kpis']),
+        # a "</script>" inside a string mustn't end the script block
+        figures=json.dumps(section['figures']).replace('</', '<\\/'),
+    )
+
+def write_file(path, text):
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(f'{path}.tmp', path)
+
+def read_manifest(out_dir):
+    try:
+        with open(f'{out_dir}/{MANIFEST_FILE}') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def export_default_view(out_dir='./export', root='./data', countries=DEFAULT_COUNTRIES, force=False):
+    data_dir = store.live_data_dir(root)
+    from_year, to_year = default_year_range(data_dir)
+    metrics = [metric for metric in METRICS_BY_LABEL.values() if get_data.is_stored(metric, data_dir)]
+    versions = {metric: get_data.metric_data_version(metric, data_dir) for metric in metrics}
+    previous = read_manifest(out_dir)
+    # the menu on every page lists which metrics have a page, so a new one means redoing them all
+    unchanged = not force and all(
+        previous.get(key) == value
+        for key, value in [('format', EXPORT_FORMAT_VERSION), ('countries', list(countries)), ('from_year', from_year), ('to_year', to_year)]
+    ) and set(previous.get('versions', {})) == set(metrics)
+    os.makedirs(out_dir, exist_ok=True)
+    rendered = 0
+    for metric in metrics:
+        if unchanged and previous['versions'][metric] == versions[metric] and os.path.exists(f'{out_dir}/{metric}.html'):
+            continue
+        section = export_section(metric, data_dir, countries, from_year, to_year)
+        write_file(f'{out_dir}/{metric}.json', json.dumps(section))
+        page = render_page(section, metrics)
+        write_file(f'{out_dir}/{metric}.html', page)
+        if metric == metrics[0]:
+            write_file(f'{out_dir}/index.html', page)
+        rendered += 1
+    manifest = {
+        'format': EXPORT_FORMAT_VERSION,
+        'generated': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'countries': list(countries),
+        'from_year': from_year,
+        'to_year': to_year,
+        'versions': versions,
+    }
+    write_file(f'{out_dir}/{MANIFEST_FILE}', json.dumps(manifest, indent=2))
+    logger.info(f'Exported {rendered} metric pages to {out_dir} ({len(metrics) - rendered} unchanged) 📦')
+    return manifest
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Pre-render the default view of every metric as static HTML and JSON')
+    parser.add_argument('--root', default='./data')
+    parser.add_argument('--out', default='./export')
+    parser.add_argument('--force', action='store_true', help='render every metric, changed or not')
+    args = parser.parse_args()
+    export_default_view(args.out, args.root, force=args.force)
@@ -0,0 +1,58 @@
+import threading
+import plotly.io as pio
+from cachetools import LRUCache
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+FIGURE_CACHE_SIZE = config('FIGURE_CACHE_SIZE', default=256, cast=int)
+
+def figure_key(metric, countries, from_year, to_year, chart):
+    # selection order doesn't change the figure, so it doesn't change the key
+    return (metric, tuple(sorted(countries)), int(from_year), int(to_year), chart)
+
+class FigureCache:
+    # Plotly figures serialized to JSON, LRU-evicted. Entries are tagged with the
+    # data version they were built from and dropped once a metric moves on.
+
+    def __init__(self, maxsize=FIGURE_CACHE_SIZE):
+        self._figures = LRUCache(maxsize=maxsize)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _invalidate_if_stale(self, metric, version):
+        if self._versions.get(metric, version) != version:
+            stale = [key for key in self._figures if key[0][0] == metric]
+            for key in stale:
+                del self._figures[key]
+            logger.info(f'{metric} data changed, dropped {len(stale)} cached figures 🗑️')
+        self._versions[metric] = version
+
+    def get_or_build(self, key, version, build):
+        with self._lock:
+            self._invalidate_if_stale(key[0], version)
+            spec = self._figures.get((key, version))
+            if spec is not None:
+                self.hits += 1
+        if spec is not None:
+            return pio.from_json(spec)
+        figure = build()
+        with self._lock:
+            self.misses += 1
+            if self._versions.get(key[0]) == version:
+                self._figures[(key, version)] = pio.to_json(figure, validate=False)
+        return figure
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._figures),
+                'maxsize': self._figures.maxsize,
+            }
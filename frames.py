@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from constants import COUNTRY_CODES_W_FLAGS, COUNTRY_GROUP_LABELS
+from metrics import METRICS
+
+# Metric frames are kept compact: Country is a categorical of ISO3 codes over
+# every known country and peer group, Year is int16 and the values are float32
+# wherever that still gives back the same rounded numbers. The flags, float64
+# values and the formatted text columns are only built for the rows a section
+# actually shows.
+
+def round_to(values, decimals):
+    # same maths as np.round(x, d), but `decimals` can vary row by row
+    factor = 10.0 ** decimals
+    return np.round(values * factor) / factor
+
+def country_categorical(codes):
+    extras = sorted(set(pd.unique(codes)) - COUNTRY_CODES_W_FLAGS.keys() - COUNTRY_GROUP_LABELS.keys())
+    return pd.Categorical(codes, categories=[*COUNTRY_CODES_W_FLAGS, *COUNTRY_GROUP_LABELS, *extras])
+
+def country_mask(country, countries):
+    # isin() on the integer codes: a lookup table over the categories, the
+    # extra last slot catches the -1 code of a missing country
+    categorical = country.array
+    positions = categorical.categories.get_indexer(countries)
+    lookup = np.zeros(len(categorical.categories) + 1, dtype=bool)
+    lookup[positions[positions >= 0]] = True
+    return lookup[categorical.codes]
+
+def country_label(country):
+    return COUNTRY_CODES_W_FLAGS.get(country) or COUNTRY_GROUP_LABELS.get(country, country)
+
+def restore_values(values, decimals, multiplier=1):
+    return round_to(np.asarray(values, dtype=float) / multiplier, decimals) * multiplier
+
+def compact_values(values, decimals, multiplier=1):
+    # float32 holds ~7 significant digits, fine for the metrics rounded to a few
+    # of them, but a value that needs more keeps its float64
+    compact = values.astype('float32')
+    if np.array_equal(restore_values(compact, decimals, multiplier), values, equal_nan=True):
+        return compact
+    return values
+
+def country_labels(country):
+    # label the categories once and index them by code
+    categorical = country.array
+    labels = np.array([country_label(code) for code in categorical.categories], dtype=object)
+    return labels[categorical.codes]
+
+def chart_values(values, metric):
+    # raw World Bank values on the scale a metric is charted in
+    spec = METRICS[metric]
+    return round_to(np.asarray(values, dtype=float) / spec['chart_scale'], spec['chart_decimals']) * spec['chart_multiplier']
+
+def kpi_text(value, metric):
+    spec = METRICS[metric]
+    return spec['format'].format(round_to(value / spec['scale'], spec['decimals']))
+
+def kpi_with_delta(values, format_str, decimals=None, calc_per_change=True):
+    # the value and YoY delta text of one KPI, `values` newest year first
+    if decimals is not None:
+        # the frames keep float32, back to the rounded float64 values
+        values = values.head(2).astype(float).round(decimals)
+    delta = None
+    if calc_per_change:
+        try:
+            percentage_change = (
+                100 * ((values.iloc[0] / values.iloc[1]) - 1)
+            )
+            delta = '{change}% (YoY)'.format(
+                change=round(percentage_change, 2)
+            )
+        except Exception as err:
+            print('❌' + str(err))
+    return format_str.format(values.iloc[0]), delta
+
+def for_display(metric_df, metric, text=True):
+    spec = METRICS[metric]
+    kpi = restore_values(metric_df[spec['kpi_col']], spec['decimals'])
+    display_df = metric_df.assign(**{
+        'Country': country_labels(metric_df['Country']),
+        spec['name']: restore_values(metric_df[spec['name']], spec['chart_decimals'], spec['chart_multiplier']),
+        spec['kpi_col']: kpi,
+    })
+    if text and spec['text_col'] is not None:
+        display_df[spec['text_col']] = [spec['format'].format(value) for value in kpi]
+    return display_df
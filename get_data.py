@@ -1,298 +1,378 @@
+import json
 import os
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
-from constants import COUNTRY_CODES_W_FLAGS
+from metrics import METRICS, CORE_METRICS
+from derived import derive_series
+from frames import round_to, country_categorical, compact_values
+from query import index_metric
+from panel import build_panel
+from groups import aggregate_groups
+import store
+import catalog
+from timing import span
 import coloredlogs, logging
 from decouple import config
-from scrape import scrape_core_metrics_for_core_countries
 logger = logging.getLogger(__name__)
 coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
 
-def check_if_data_exists(folder):
-    logger.info(f'Checking if data exists in {folder}...')
-    if not os.path.exists(f'./data/{folder}'):
+PREFETCH_LIMIT = config('PREFETCH_LIMIT', default=3, cast=int)
+
+class DataNotReady(Exception):
+    pass
+
+def check_if_data_exists(folder, data_dir='./data'):
+    logger.info(f'Checking if data exists in {data_dir}/{folder}...')
+    if not store.metric_exists(folder, data_dir):
         logger.warning('No data found. Scrape the data first.')
         return False
     else:
         logger.info('Data found! ✅')
         return True
 
-def get_and_combine_data_from_folder(folder):
-    data_exists = check_if_data_exists(folder)
+def get_and_combine_data_from_folder(folder, data_dir=None):
+    data_dir = data_dir or store.live_data_dir()
+    data_exists = check_if_data_exists(folder, data_dir)
+    if not data_exists and catalog.is_on_demand(folder):
+        # the one scrape a page load does: the first request for a catalog metric.
+        # It's published as a new version, read from there until the app moves over
+        fetched_dir = catalog.fetch_on_demand(folder, data_dir)
+        if fetched_dir is not None:
+            data_dir, data_exists = fetched_dir, True
     if not data_exists:
-        logger.info('Scraping the data...')
-        scrape_core_metrics_for_core_countries()
+        # otherwise never scrape inside a page load, see refresh.request_refresh
+        raise DataNotReady(folder)
     logger.info(f'Getting data from {folder} 📂...')
-    dfs = []
-    for file in os.listdir(f'./data/{folder}'):
-        if file.endswith('.csv'):
-            df = pd.read_csv(f'./data/{folder}/{file}')
-            dfs.append(df)
-    combined_df = pd.concat(dfs)
+    with span(f'read {folder}'):
+        combined_df = store.read_metric(folder, data_dir=data_dir)
     logger.info(f'Finished getting data from {folder} ✅')
     return combined_df 
 
-@st.cache_data
-def get_gdp_data():
-    raw_gdp_df = get_and_combine_data_from_folder('gdp')
-    gdp_df = raw_gdp_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'GDP'
-    }).dropna(subset=['GDP'])
-    gdp_df['Country'] = gdp_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    gdp_df['Year'] = pd.to_numeric(gdp_df['Year'])
-    gdp_df['GDP (T-int)'] = round(gdp_df['GDP'] / 1e12, 2)
-    gdp_df['GDP (T)'] = [
-        f'${val:,.1f}T' for val in
-        gdp_df['GDP (T-int)']
-    ]
-    gdp_df['GDP'] = (gdp_df['GDP'] / 1e9).round(0) * 1e9
-    return gdp_df.sort_values(by='Year', ascending=False)    
-
-@st.cache_data
-def get_population_data():
-    raw_population_df = get_and_combine_data_from_folder('population')
-    population_df = raw_population_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Population'
-    }).dropna(subset=['Population'])
-    population_df['Country'] = population_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    population_df['Year'] = pd.to_numeric(population_df['Year'])
-    population_df['Population (M-int)'] = round(population_df['Population'] / 1e6, 1)
-    population_df['Population (M)'] = [
-        f'{val:,.1f}M' for val in
-        population_df['Population (M-int)']
-    ]
-    population_df['Population'] = (population_df['Population'] / 1e6).round(0) * 1e6
-    return population_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data
-def get_gdp_per_capita():
-    raw_gdp_per_capita_df = get_and_combine_data_from_folder('gdp_per_capita')
-    gdp_per_capita_df = raw_gdp_per_capita_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'GDP per Capita'
-    }).dropna(subset=['GDP per Capita'])
-    gdp_per_capita_df['Country'] = gdp_per_capita_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    gdp_per_capita_df['Year'] = pd.to_numeric(gdp_per_capita_df['Year'])
-    gdp_per_capita_df['GDP per Capita (k-int)'] = round(gdp_per_capita_df['GDP per Capita'] / 1e3, 1)
-    gdp_per_capita_df['GDP per Capita (k)'] = [
-        f'${val:,.0f}k' for val in
-        gdp_per_capita_df['GDP per Capita (k-int)']
-    ]
-    gdp_per_capita_df['GDP per Capita'] = (gdp_per_capita_df['GDP per Capita'] / 1e3).round(0) * 1e3
-    return gdp_per_capita_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_government_debt():
-    raw_government_debt_df = get_and_combine_data_from_folder('government_debt')
-    government_debt_df = raw_government_debt_df.rename(columns={
+def load_raw_metric(folder, data_dir=None):
+    raw_df = get_and_combine_data_from_folder(folder, data_dir)
+    return raw_df.rename(columns={
         'countryiso3code': 'Country',
         'date': 'Year',
-        'value': 'Government Debt vs GDP'
-    }).dropna(subset=['Government Debt vs GDP'])
-    government_debt_df['Country'] = government_debt_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    government_debt_df['Year'] = pd.to_numeric(government_debt_df['Year'])
-    government_debt_df['Government Debt vs GDP (%)'] = government_debt_df['Government Debt vs GDP'].round(0)
-    government_debt_df['Government Debt vs GDP (%-str)'] = [
-        f'{int(val)}%' for val in
-        government_debt_df['Government Debt vs GDP (%)']
-    ]
-    government_debt_df['Government Debt vs GDP'] = (government_debt_df['Government Debt vs GDP'] / 100).round(2)
-    return government_debt_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_labour_force_participation_rate():
-    raw_lfpr_df = get_and_combine_data_from_folder('labour_force_participation_rate')
-    lfpr_df = raw_lfpr_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Labour Force Participation Rate'
-    }).dropna(subset=['Labour Force Participation Rate'])
-    lfpr_df['Country'] = lfpr_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    lfpr_df['Year'] = pd.to_numeric(lfpr_df['Year'])
-    lfpr_df['Labour Force Participation Rate (%)'] = lfpr_df['Labour Force Participation Rate'].round(1)
-    lfpr_df['Labour Force Participation Rate (%-str)'] = [
-        f'{round(val, 1)}%' for val in
-        lfpr_df['Labour Force Participation Rate (%)']
-    ]
-    lfpr_df['Labour Force Participation Rate'] = (lfpr_df['Labour Force Participation Rate'] / 100).round(3)
-    return lfpr_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_consumer_price_index():
-    raw_cpi_df = get_and_combine_data_from_folder('consumer_price_index')
-    cpi_df = raw_cpi_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Consumer Price Index'
-    }).dropna(subset=['Consumer Price Index'])
-    cpi_df['Country'] = cpi_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    cpi_df['Year'] = pd.to_numeric(cpi_df['Year'])
-    cpi_df['Consumer Price Index (%)'] = cpi_df['Consumer Price Index'].round(0)
-    cpi_df['Consumer Price Index (%-str)'] = [
-        f'{int(val)}%' for val in
-        cpi_df['Consumer Price Index (%)']
-    ]
-    cpi_df['Consumer Price Index'] = (cpi_df['Consumer Price Index'] / 100).round(2)
-    return cpi_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_gdp_growth_rate():
-    raw_gdp_df = get_and_combine_data_from_folder('gdp')
-    gdp_df = raw_gdp_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'GDP'
-    }).dropna(subset=['GDP'])
-    gdp_df['Country'] = gdp_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    gdp_df['Year'] = pd.to_numeric(gdp_df['Year'])
-    gdp_df_prev_year = gdp_df.copy()[['Country', 'Year', 'GDP']]
-    gdp_df_prev_year['Year'] = gdp_df_prev_year['Year'] + 1
-    gdp_growth_rate_df = gdp_df.merge(
-        gdp_df_prev_year,
-        on=['Country', 'Year'],
-        how='left',
-        suffixes=('', '_prev')
+        'value': 'Value'
+    }).dropna(subset=['Value'])[['Country', 'Year', 'Value']]
+
+def series_key(metric):
+    # base metrics are keyed by their store folder, derived ones by what they're
+    # computed from, so two entries with the same definition share one result
+    spec = METRICS[metric]
+    if 'derive' not in spec:
+        return ('folder', spec['folder'], spec.get('aggregate'))
+    return (
+        spec['derive'],
+        tuple(series_key(dependency) for dependency in spec['inputs']),
+        tuple(sorted(spec.get('params', {}).items())),
     )
-    gdp_growth_rate_df['GDP Growth Rate'] = 100 * ((gdp_growth_rate_df['GDP'] / gdp_growth_rate_df['GDP_prev']) - 1)
-    gdp_growth_rate_df['Year'] = pd.to_numeric(gdp_growth_rate_df['Year'])
-    gdp_growth_rate_df['GDP Growth Rate (%)'] = gdp_growth_rate_df['GDP Growth Rate'].round(1)
-    gdp_growth_rate_df['GDP Growth Rate (%-str)'] = [
-        f'{round(val, 1)}%' for val in
-        gdp_growth_rate_df['GDP Growth Rate (%)']
-    ]
-    gdp_growth_rate_df['GDP Growth Rate'] = (gdp_growth_rate_df['GDP Growth Rate'] / 100).round(3)
-    return gdp_growth_rate_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_population_growth_rate():
-    raw_population_growth_rate_df = get_and_combine_data_from_folder('population_growth_rate')
-    population_growth_rate_df = raw_population_growth_rate_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Population Growth Rate'
-    }).dropna(subset=['Population Growth Rate'])
-    population_growth_rate_df['Country'] = population_growth_rate_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    population_growth_rate_df['Year'] = pd.to_numeric(population_growth_rate_df['Year'])
-    population_growth_rate_df['Population Growth Rate (%)'] = population_growth_rate_df['Population Growth Rate'].round(1)
-    population_growth_rate_df['Population Growth Rate (%-str)'] = [
-        f'{round(val, 1)}%' for val in
-        population_growth_rate_df['Population Growth Rate (%)']
-    ]
-    population_growth_rate_df['Population Growth Rate'] = (population_growth_rate_df['Population Growth Rate'] / 100).round(3)
-    return population_growth_rate_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_unemployment_rate():
-    raw_unemployment_rate_df = get_and_combine_data_from_folder('unemployment_rate')
-    unemployment_rate_df = raw_unemployment_rate_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Unemployment Rate'
-    }).dropna(subset=['Unemployment Rate'])
-    unemployment_rate_df['Country'] = unemployment_rate_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    unemployment_rate_df['Year'] = pd.to_numeric(unemployment_rate_df['Year'])
-    unemployment_rate_df['Unemployment Rate (%)'] = unemployment_rate_df['Unemployment Rate'].round(1)
-    unemployment_rate_df['Unemployment Rate (%-str)'] = [
-        f'{round(val, 1)}%' for val in
-        unemployment_rate_df['Unemployment Rate (%)']
-    ]
-    unemployment_rate_df['Unemployment Rate'] = (unemployment_rate_df['Unemployment Rate'] / 100).round(3)
-    return unemployment_rate_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_trade_balance():
-    raw_trade_balance_df = get_and_combine_data_from_folder('trade_balance')
-    trade_balance_df = raw_trade_balance_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Trade Balance'
-    }).dropna(subset=['Trade Balance'])
-    trade_balance_df['Country'] = trade_balance_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    trade_balance_df['Year'] = pd.to_numeric(trade_balance_df['Year'])
-    trade_balance_df['Trade Balance (%)'] = trade_balance_df['Trade Balance'].round(1)
-    trade_balance_df['Trade Balance (%-str)'] = [
-        f'{round(val, 1)}%' for val in
-        trade_balance_df['Trade Balance (%)']
-    ]
-    trade_balance_df['Trade Balance'] = (trade_balance_df['Trade Balance'] / 100).round(3)
-    return trade_balance_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_exports():
-    raw_exports_df = get_and_combine_data_from_folder('exports')
-    exports_df = raw_exports_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Exports'
-    }).dropna(subset=['Exports'])
-    exports_df['Country'] = exports_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    exports_df['Year'] = pd.to_numeric(exports_df['Year'])
-    exports_df['Exports (T-int)'] = round(exports_df['Exports'] / 1e12, 2)
-    exports_df['Exports (T)'] = [
-        f'${val:,.2f}T' for val in
-        exports_df['Exports (T-int)']
-    ]
-    exports_df['Exports'] = (exports_df['Exports'] / 1e9).round(0) * 1e9
-    return exports_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_imports():
-    raw_imports_df = get_and_combine_data_from_folder('imports')
-    imports_df = raw_imports_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Imports'
-    }).dropna(subset=['Imports'])
-    imports_df['Country'] = imports_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    imports_df['Year'] = pd.to_numeric(imports_df['Year'])
-    imports_df['Imports (T-int)'] = round(imports_df['Imports'] / 1e12, 2)
-    imports_df['Imports (T)'] = [
-        f'${val:,.2f}T' for val in
-        imports_df['Imports (T-int)']
-    ]
-    imports_df['Imports'] = (imports_df['Imports'] / 1e9).round(0) * 1e9
-    return imports_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_birth_rate():
-    raw_birth_rate_df = get_and_combine_data_from_folder('birth_rate')
-    birth_rate_df = raw_birth_rate_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Birth Rate'
-    }).dropna(subset=['Birth Rate'])
-    birth_rate_df['Country'] = birth_rate_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    birth_rate_df['Year'] = pd.to_numeric(birth_rate_df['Year'])
-    birth_rate_df['Birth Rate'] = birth_rate_df['Birth Rate'].round(1)
-    return birth_rate_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_death_rate():
-    raw_death_rate_df = get_and_combine_data_from_folder('death_rate')
-    death_rate_df = raw_death_rate_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Death Rate'
-    }).dropna(subset=['Death Rate'])
-    death_rate_df['Country'] = death_rate_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    death_rate_df['Year'] = pd.to_numeric(death_rate_df['Year'])
-    death_rate_df['Death Rate'] = death_rate_df['Death Rate'].round(1)
-    return death_rate_df.sort_values(by='Year', ascending=False)
-
-@st.cache_data()
-def get_life_expectancy():
-    raw_life_expectancy_df = get_and_combine_data_from_folder('life_expectancy')
-    life_expectancy_df = raw_life_expectancy_df.rename(columns={
-        'countryiso3code': 'Country',
-        'date': 'Year',
-        'value': 'Life Expectancy'
-    }).dropna(subset=['Life Expectancy'])
-    life_expectancy_df['Country'] = life_expectancy_df['Country'].replace(COUNTRY_CODES_W_FLAGS)
-    life_expectancy_df['Year'] = pd.to_numeric(life_expectancy_df['Year'])
-    life_expectancy_df['Life Expectancy'] = life_expectancy_df['Life Expectancy'].round(1)
-    return life_expectancy_df.sort_values(by='Year', ascending=False)
\ No newline at end of file
+
+# (Country, Year, Value) per (data dir, series_key), shared by every load in the process
+_series_cache = {}
+
+def load_series(metric, data_dir=None):
+    data_dir = data_dir or store.live_data_dir()
+    key = (data_dir, series_key(metric))
+    if key not in _series_cache:
+        spec = METRICS[metric]
+        if 'derive' in spec:
+            inputs = [load_series(dependency, data_dir) for dependency in spec['inputs']]
+            with span(f'derive {metric}'):
+                _series_cache[key] = derive_series(spec['derive'], inputs, spec.get('params'))
+        else:
+            _series_cache[key] = with_groups(load_raw_metric(spec['folder'], data_dir), metric, data_dir)
+    return _series_cache[key]
+
+def with_groups(series, metric, data_dir=None):
+    # the peer groups become rows like any other country's, see groups.py
+    how = METRICS[metric].get('aggregate')
+    if how is None or not len(series):
+        return series
+    weights = None if how == 'sum' else load_series(how, data_dir)
+    with span(f'groups {metric}'):
+        return pd.concat([series, aggregate_groups(series, how, weights)], ignore_index=True)
+
+def metric_data_version(metric, data_dir=None):
+    data_dir = data_dir or store.live_data_dir()
+    spec = METRICS[metric]
+    if 'derive' not in spec:
+        version = store.metric_version(spec['folder'], data_dir)
+        if spec.get('aggregate') not in (None, 'sum'):
+            # the group means move with their weights too
+            return f"{version}+{metric_data_version(spec['aggregate'], data_dir)}"
+        return version
+    return '+'.join(str(metric_data_version(dependency, data_dir)) for dependency in spec['inputs'])
+
+def stored_folders(metric):
+    # every store folder a metric is computed from
+    spec = METRICS[metric]
+    if 'derive' in spec:
+        return {folder for dependency in spec['inputs'] for folder in stored_folders(dependency)}
+    if spec.get('aggregate') not in (None, 'sum'):
+        return {spec['folder'], *stored_folders(spec['aggregate'])}
+    return {spec['folder']}
+
+def is_stored(metric, data_dir=None):
+    # loadable without a scrape
+    data_dir = data_dir or store.live_data_dir()
+    return all(store.metric_exists(folder, data_dir) for folder in stored_folders(metric))
+
+def clear_series_cache(keep_data_dir=None):
+    # list() copies the keys in one go: sessions, the prefetch pool and the
+    # API's executor threads keep adding to both caches while this runs
+    for key in [key for key in list(_series_cache) if key[0] != keep_data_dir]:
+        _series_cache.pop(key, None)
+    for key in [key for key in list(_snapshots) if key != keep_data_dir]:
+        _snapshots.pop(key, None)
+
+def build_metrics_table(metrics, data_dir=None):
+    # long format: one row per (Metric, Country, Year) for every requested metric
+    parts = [load_series(metric, data_dir).assign(Metric=metric) for metric in metrics]
+    with span('transform'):
+        return transform_metrics_table(parts, metrics)
+
+def transform_metrics_table(parts, metrics):
+    table = pd.concat(parts, ignore_index=True)
+    table['Metric'] = pd.Categorical(table['Metric'], categories=list(metrics))
+    table['Country'] = country_categorical(table['Country'])
+    table['Year'] = pd.to_numeric(table['Year']).astype('int16')
+
+    params = pd.DataFrame.from_dict(METRICS, orient='index').loc[list(metrics)]
+    codes = table['Metric'].cat.codes.to_numpy()
+    def param(name):
+        return params[name].to_numpy(dtype=float)[codes]
+    value = table['Value'].to_numpy(dtype=float)
+    table['KPI'] = round_to(value / param('scale'), param('decimals'))
+    table['Chart'] = round_to(value / param('chart_scale'), param('chart_decimals')) * param('chart_multiplier')
+    return table.sort_values(by=['Metric', 'Year'], ascending=[True, False], kind='stable', ignore_index=True)
+
+def to_metric_frame(metric_table, metric):
+    # the text column and the flags are added at render time, see frames.for_display
+    spec = METRICS[metric]
+    return pd.DataFrame({
+        'Country': metric_table['Country'].array,
+        'Year': metric_table['Year'].to_numpy(dtype='int16'),
+        spec['name']: compact_values(metric_table['Chart'].to_numpy(dtype=float), spec['chart_decimals'], spec['chart_multiplier']),
+        spec['kpi_col']: compact_values(metric_table['KPI'].to_numpy(dtype=float), spec['decimals']),
+    })
+
+# The fully transformed table for every metric, written next to the store by
+# `python snapshot.py` (and by each refresh) so a fresh server skips the loaders.
+# It's an uncompressed Arrow IPC file that every worker process memory-maps, so
+# replicas share one copy of it in the page cache instead of each decoding its own.
+SNAPSHOT_FILE = 'metrics_table.arrow'
+SNAPSHOT_VERSIONS_FILE = 'metrics_table.json'
+SNAPSHOT_ROWS_KEY = b'metric_rows'
+
+# data dir -> memory-mapped snapshot table, or None when there isn't a usable one
+_snapshots = {}
+
+def to_snapshot_table(table, metrics):
+    # Metric and Country are categoricals, so they're stored dictionary-encoded
+    arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+    # the table is sorted by metric, so each one is a contiguous run of rows
+    counts = np.bincount(table['Metric'].cat.codes.to_numpy(), minlength=len(metrics))
+    starts = np.cumsum(counts) - counts
+    rows = {metric: [int(start), int(count)] for metric, start, count in zip(metrics, starts, counts)}
+    return arrow_table.replace_schema_metadata({**arrow_table.schema.metadata, SNAPSHOT_ROWS_KEY: json.dumps(rows)})
+
+def write_snapshot(data_dir=None, metrics=CORE_METRICS):
+    data_dir = data_dir or store.live_data_dir()
+    table = build_metrics_table(metrics, data_dir)
+    arrow_table = to_snapshot_table(table, metrics)
+    path = f'{data_dir}/{SNAPSHOT_FILE}'
+    # a new file every time, never rewritten in place under the processes mapping it
+    with pa.OSFile(f'{path}.tmp', 'wb') as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    os.replace(f'{path}.tmp', path)
+    # the store versions it was built from, so an edited store isn't masked by it
+    versions = {metric: metric_data_version(metric, data_dir) for metric in metrics}
+    with open(f'{data_dir}/{SNAPSHOT_VERSIONS_FILE}.tmp', 'w') as f:
+        json.dump(versions, f, indent=2)
+    os.replace(f'{data_dir}/{SNAPSHOT_VERSIONS_FILE}.tmp', f'{data_dir}/{SNAPSHOT_VERSIONS_FILE}')
+    # the loaders read it from the snapshot from now on
+    for key in [key for key in list(_series_cache) if key[0] == data_dir]:
+        _series_cache.pop(key, None)
+    _snapshots.pop(data_dir, None)
+    logger.info(f'Wrote a snapshot of {len(metrics)} metrics to {path} 📸')
+    return table
+
+def load_snapshot(data_dir):
+    if data_dir not in _snapshots:
+        table = None
+        try:
+            with open(f'{data_dir}/{SNAPSHOT_VERSIONS_FILE}') as f:
+                versions = json.load(f)
+            if all(metric_data_version(metric, data_dir) == version for metric, version in versions.items()):
+                with span('map snapshot'):
+                    # zero-copy: the columns point straight into the mapped file
+                    table = pa.ipc.open_file(pa.memory_map(f'{data_dir}/{SNAPSHOT_FILE}')).read_all()
+            else:
+                logger.warning(f'The snapshot in {data_dir} is older than the store, not using it')
+        except FileNotFoundError:
+            pass
+        _snapshots[data_dir] = table
+    return _snapshots[data_dir]
+
+def snapshot_rows(table):
+    # metric -> [first row, row count] in the snapshot, {} without one
+    return json.loads(table.schema.metadata[SNAPSHOT_ROWS_KEY]) if table is not None else {}
+
+def load_metric_frame(metric, data_dir=None):
+    data_dir = data_dir or store.live_data_dir()
+    table = load_snapshot(data_dir)
+    rows = snapshot_rows(table)
+    if metric in rows:
+        start, count = rows[metric]
+        # only this metric's rows leave the mapping
+        metric_table = table.slice(start, count).to_pandas(split_blocks=True)
+        return to_metric_frame(metric_table, metric)
+    return to_metric_frame(build_metrics_table((metric,), data_dir), metric)
+
+def load_metric_series(metric, data_dir=None):
+    # the raw (Country, Year, Value) series with a categorical Country, for the
+    # data API: straight off the snapshot when it has the metric
+    data_dir = data_dir or store.live_data_dir()
+    table = load_snapshot(data_dir)
+    rows = snapshot_rows(table)
+    if metric in rows:
+        start, count = rows[metric]
+        return table.slice(start, count).select(['Country', 'Year', 'Value']).to_pandas()
+    series = load_series(metric, data_dir)
+    return pd.DataFrame({
+        'Country': country_categorical(series['Country']),
+        'Year': pd.to_numeric(series['Year']).astype('int16'),
+        'Value': series['Value'].to_numpy(dtype=float),
+    })
+
+def load_panel(metrics=CORE_METRICS, data_dir=None):
+    data_dir = data_dir or store.live_data_dir()
+    version = '+'.join(str(metric_data_version(metric, data_dir)) for metric in metrics)
+    table = load_snapshot(data_dir)
+    rows = snapshot_rows(table)
+    if all(metric in rows for metric in metrics):
+        # straight off the mapped snapshot, only the columns the cube needs
+        long_table = table.select(['Metric', 'Country', 'Year', 'Value']).to_pandas()
+    else:
+        long_table = build_metrics_table(metrics, data_dir)
+    with span('build panel'):
+        return build_panel(long_table, metrics, version)
+
+# Loads in flight or finished but not yet picked up by get_metric_data, keyed by
+# (metric, data dir). Shared by every session in the process so a foreground
+# load and a prefetch of the same metric only run once.
+_metric_futures = {}
+_metric_picks = Counter()
+_loaded_metrics = set()
+_metric_lock = threading.Lock()
+_prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='metric-prefetch')
+
+def load_metric(metric, data_dir):
+    key = (metric, data_dir)
+    with _metric_lock:
+        future = _metric_futures.get(key)
+        owner = future is None
+        if owner:
+            future = _metric_futures[key] = Future()
+    if owner:
+        try:
+            future.set_result(load_metric_frame(metric, data_dir))
+        except Exception as err:
+            future.set_exception(err)
+            with _metric_lock:
+                _metric_futures.pop(key, None)
+    return future.result()
+
+# The data dir pages are rendered from. When a refresh publishes a new version,
+# reruns keep getting the old dir while the new one loads in the background,
+# then every session moves over at once (stale-while-revalidate).
+_serving_data_dir = None
+_warming_data_dirs = set()
+
+def serving_data_dir():
+    global _serving_data_dir
+    latest = store.live_data_dir()
+    with _metric_lock:
+        if _serving_data_dir is None or not store.metric_exists('gdp', _serving_data_dir):
+            # nothing to serve while the new version warms, so don't wait for it
+            # (the page would hit DataNotReady and ask for yet another refresh)
+            _serving_data_dir = latest
+        if latest == _serving_data_dir or latest in _warming_data_dirs:
+            return _serving_data_dir
+        _warming_data_dirs.add(latest)
+    _prefetch_pool.submit(warm_data_dir, latest)
+    return _serving_data_dir
+
+def warm_data_dir(data_dir):
+    global _serving_data_dir
+    with _metric_lock:
+        metrics = ['gdp'] + sorted({metric for metric, loaded_dir in _loaded_metrics if loaded_dir == _serving_data_dir} - {'gdp'})
+    try:
+        for metric in metrics:
+            load_metric(metric, data_dir)
+    except Exception as err:
+        logger.error(f'Could not load {data_dir}, still serving {_serving_data_dir}: {err} ❌')
+        with _metric_lock:
+            _warming_data_dirs.discard(data_dir)
+        return
+    with _metric_lock:
+        logger.info(f'Serving data from {data_dir} 🔄')
+        _serving_data_dir = data_dir
+        _warming_data_dirs.discard(data_dir)
+        # frames of the old version nobody picked up yet aren't going to be
+        for key in [key for key, future in _metric_futures.items() if key[1] != data_dir and future.done()]:
+            del _metric_futures[key]
+        _loaded_metrics.difference_update({key for key in _loaded_metrics if key[1] != data_dir})
+    clear_series_cache(keep_data_dir=data_dir)
+
+# bounded so the frames of a superseded version age out
+@st.cache_data(max_entries=2 * len(METRICS))
+def get_metric_data(metric, data_dir):
+    # only runs on a cache miss, so the span shows up in the reruns that paid for the load
+    with span(f'load {metric}'):
+        metric_df = load_metric(metric, data_dir)
+    with _metric_lock:
+        # st.cache_data owns it from here on
+        _metric_futures.pop((metric, data_dir), None)
+        _loaded_metrics.add((metric, data_dir))
+    return metric_df
+
+# shared read-only across sessions, so reruns don't unpickle a copy of the frame
+@st.cache_resource(max_entries=2 * len(METRICS))
+def get_indexed_metric(metric, data_dir):
+    spec = METRICS[metric]
+    version = metric_data_version(metric, data_dir)
+    metric_df = get_metric_data(metric, data_dir)
+    with span(f'index {metric}'):
+        return index_metric(metric_df, rank_by=[spec['name'], spec['kpi_col']], version=version)
+
+# one cube per data version, shared read-only by every session
+@st.cache_resource(max_entries=2)
+def get_panel(data_dir):
+    return load_panel(CORE_METRICS, data_dir)
+
+def prewarm(metrics=CORE_METRICS, data_dir=None):
+    # startup hook (see serve.py): load every metric before the first visitor asks
+    data_dir = data_dir or serving_data_dir()
+    logger.info(f'Pre-warming {len(metrics)} metrics from {data_dir} 🔥')
+    return [_prefetch_pool.submit(load_metric, metric, data_dir) for metric in metrics]
+
+def prefetch_likely_metrics(selected_metric, data_dir, limit=PREFETCH_LIMIT):
+    # most picked first, ties broken by the order of the Metric selectbox
+    with _metric_lock:
+        _metric_picks[selected_metric] += 1
+        candidates = [
+            metric for metric in sorted(METRICS, key=lambda metric: -_metric_picks[metric])
+            if (metric, data_dir) not in _loaded_metrics and (metric, data_dir) not in _metric_futures
+            # a catalog metric nobody has fetched yet isn't worth a scrape on a hunch
+            and (metric in CORE_METRICS or store.metric_exists(METRICS[metric]['folder'], data_dir))
+        ][:limit]
+    for metric in candidates:
+        logger.info(f'Prefetching {metric} in the background 🔮')
+        _prefetch_pool.submit(load_metric, metric, data_dir)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from constants import COUNTRY_GROUPS
+from derived import to_grid
+from decouple import config
+
+# Peer-group series (G7, EU, ...) built from their members when a metric loads,
+# so they're cached and snapshotted next to the countries and a rerun just
+# selects them. Every group is reduced at once: a (groups x countries)
+# membership matrix times the (countries x years) value grid.
+#
+#   'sum'        total of the members, only for years every member reported
+#   <metric>     mean weighted by that metric (e.g. 'population', 'gdp'), for
+#                years where at least GROUP_MIN_COVERAGE of the members reported
+GROUP_MIN_COVERAGE = config('GROUP_MIN_COVERAGE', default=0.8, cast=float)
+
+def membership(countries):
+    # countries that aren't in any group (or are groups themselves) get a zero column
+    return np.array([
+        [country in COUNTRY_GROUPS[group] for country in countries]
+        for group in COUNTRY_GROUPS
+    ], dtype=float)
+
+def group_sizes():
+    # counted off the definitions, a member with no data at all still counts
+    return np.array([len(set(members)) for members in COUNTRY_GROUPS.values()], dtype=float)[:, None]
+
+def aggregate_groups(series, how, weights=None):
+    # (Country, Year, Value) rows for every group with enough members reporting
+    inputs = [series] if how == 'sum' else [series, weights]
+    countries, years, grids = to_grid(*inputs)
+    members = membership(countries)
+    values = grids[0]
+    if how == 'sum':
+        known = np.isfinite(values)
+        result = members @ np.where(known, values, 0.0)
+        enough = members @ known >= group_sizes()
+    else:
+        known = np.isfinite(values) & np.isfinite(grids[1])
+        weight = np.where(known, grids[1], 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = (members @ (np.where(known, values, 0.0) * weight)) / (members @ weight)
+        enough = members @ known >= GROUP_MIN_COVERAGE * group_sizes()
+    rows, cols = np.nonzero(enough & np.isfinite(result))
+    return pd.DataFrame({
+        'Country': np.array(list(COUNTRY_GROUPS), dtype=object)[rows],
+        'Year': years[cols].astype(series['Year'].dtype),
+        'Value': result[rows, cols],
+    })
@@ -0,0 +1,340 @@
+# Every indicator on the dashboard is described once here.
+#
+# Loading:  `folder` is the store entry the raw series comes from, a metric with
+#           `derive` is computed by derived.DERIVATIONS[derive] from the `inputs`
+#           metrics (base or derived) with optional keyword `params`.
+# Values:   `name`      <- round(value / chart_scale, chart_decimals) * chart_multiplier  (charts)
+#           `kpi_col`   <- round(value / scale, decimals)                                 (KPI strip)
+#           `text_col`  <- `format` applied to `kpi_col`, None to label bars with `name`
+# Display:  the rest feeds create_section_for_metric in streamlit_app.py.
+# Groups:   `aggregate` is how the peer-group series are built from their
+#           members, 'sum' or a mean weighted by another metric (groups.py),
+#           None for no groups (the per-land ones, there's no land area to
+#           weight by). Derived metrics are derived from their inputs' groups.
+# Catalog:  `on_demand` metrics aren't scraped up front, catalog.py fetches one
+#           the first time somebody opens it.
+METRICS = {
+    'gdp_per_capita': {
+        'label': 'GDP / Capita 💰',
+        'folder': 'gdp_per_capita',
+        'aggregate': 'population',
+        'name': 'GDP per Capita',
+        'section_title': 'Annual GDP per Capita',
+        'scale': 1e3, 'decimals': 1,
+        'chart_scale': 1e3, 'chart_decimals': 0, 'chart_multiplier': 1e3,
+        'kpi_col': 'GDP per Capita (k-int)',
+        'text_col': 'GDP per Capita (k)',
+        'format': '${:,.0f}k',
+        'delta_color': 'normal',
+        'tick_format': '$.2s',
+    },
+    'gdp': {
+        'label': 'GDP 💰',
+        'folder': 'gdp',
+        'aggregate': 'sum',
+        'name': 'GDP',
+        'section_title': 'Annual GDP',
+        'scale': 1e12, 'decimals': 2,
+        'chart_scale': 1e9, 'chart_decimals': 0, 'chart_multiplier': 1e9,
+        'kpi_col': 'GDP (T-int)',
+        'text_col': 'GDP (T)',
+        'format': '${:,.1f}T',
+        'delta_color': 'normal',
+        'tick_format': '$.2s',
+    },
+    'population': {
+        'label': 'Population 👥',
+        'folder': 'population',
+        'aggregate': 'sum',
+        'name': 'Population',
+        'section_title': 'Population',
+        'scale': 1e6, 'decimals': 1,
+        'chart_scale': 1e6, 'chart_decimals': 0, 'chart_multiplier': 1e6,
+        'kpi_col': 'Population (M-int)',
+        'text_col': 'Population (M)',
+        'format': '{:,.1f}M',
+        'delta_color': 'normal',
+        'tick_format': None,
+    },
+    'government_debt': {
+        'label': 'Government Debt 💳',
+        'folder': 'government_debt',
+        'aggregate': 'gdp',
+        'name': 'Government Debt vs GDP',
+        'section_title': 'Government Debt vs GDP',
+        'scale': 1, 'decimals': 0,
+        'chart_scale': 100, 'chart_decimals': 2, 'chart_multiplier': 1,
+        'kpi_col': 'Government Debt vs GDP (%)',
+        'text_col': 'Government Debt vs GDP (%-str)',
+        'format': '{:.0f}%',
+        'delta_color': 'inverse',
+        'tick_format': '.0%',
+    },
+    'consumer_price_index': {
+        'label': 'Consumer Price Index 🛒',
+        'folder': 'consumer_price_index',
+        'aggregate': 'gdp',
+        'name': 'Consumer Price Index',
+        'section_title': 'Consumer Price Index (vs 2010)',
+        'scale': 1, 'decimals': 0,
+        'chart_scale': 100, 'chart_decimals': 2, 'chart_multiplier': 1,
+        'kpi_col': 'Consumer Price Index (%)',
+        'text_col': 'Consumer Price Index (%-str)',
+        'format': '{:.0f}%',
+        'delta_color': 'inverse',
+        'tick_format': '.0%',
+    },
+    'gdp_growth_rate': {
+        'label': 'GDP Growth Rate 📈',
+        'derive': 'yoy_growth',
+        'inputs': ('gdp',),
+        'name': 'GDP Growth Rate',
+        'section_title': 'GDP Growth Rate',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 100, 'chart_decimals': 3, 'chart_multiplier': 1,
+        'kpi_col': 'GDP Growth Rate (%)',
+        'text_col': 'GDP Growth Rate (%-str)',
+        'format': '{:.1f}%',
+        'delta_color': 'normal',
+        'tick_format': '.1%',
+    },
+    'gdp_growth_rate_5y_avg': {
+        'label': 'GDP Growth Rate (5y avg) 📈',
+        'derive': 'rolling_mean',
+        'inputs': ('gdp_growth_rate',),
+        'params': {'window': 5},
+        'name': 'GDP Growth Rate (5y avg)',
+        'section_title': 'GDP Growth Rate (5 year rolling average)',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 100, 'chart_decimals': 3, 'chart_multiplier': 1,
+        'kpi_col': 'GDP Growth Rate (5y avg) (%)',
+        'text_col': 'GDP Growth Rate (5y avg) (%-str)',
+        'format': '{:.1f}%',
+        'delta_color': 'normal',
+        'tick_format': '.1%',
+    },
+    'population_growth_rate': {
+        'label': 'Population Growth Rate 📈',
+        'folder': 'population_growth_rate',
+        'aggregate': 'population',
+        'name': 'Population Growth Rate',
+        'section_title': 'Population Growth Rate',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 100, 'chart_decimals': 3, 'chart_multiplier': 1,
+        'kpi_col': 'Population Growth Rate (%)',
+        'text_col': 'Population Growth Rate (%-str)',
+        'format': '{:.1f}%',
+        'delta_color': 'normal',
+        'tick_format': '.1%',
+    },
+    'labour_force_participation_rate': {
+        'label': 'Labour Force Participation Rate 💼',
+        'folder': 'labour_force_participation_rate',
+        'aggregate': 'population',
+        'name': 'Labour Force Participation Rate',
+        'section_title': 'Labour Force Participation Rate',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 100, 'chart_decimals': 3, 'chart_multiplier': 1,
+        'kpi_col': 'Labour Force Participation Rate (%)',
+        'text_col': 'Labour Force Participation Rate (%-str)',
+        'format': '{:.1f}%',
+        'delta_color': 'normal',
+        'tick_format': '.1%',
+    },
+    'unemployment_rate': {
+        'label': 'Unemployment Rate 🛋️',
+        'folder': 'unemployment_rate',
+        'aggregate': 'population',
+        'name': 'Unemployment Rate',
+        'section_title': 'Unemployment Rate',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 100, 'chart_decimals': 3, 'chart_multiplier': 1,
+        'kpi_col': 'Unemployment Rate (%)',
+        'text_col': 'Unemployment Rate (%-str)',
+        'format': '{:.1f}%',
+        'delta_color': 'inverse',
+        'tick_format': '.1%',
+    },
+    'exports': {
+        'label': 'Exports ➡️',
+        'folder': 'exports',
+        'aggregate': 'sum',
+        'name': 'Exports',
+        'section_title': 'Exports',
+        'scale': 1e12, 'decimals': 2,
+        'chart_scale': 1e9, 'chart_decimals': 0, 'chart_multiplier': 1e9,
+        'kpi_col': 'Exports (T-int)',
+        'text_col': 'Exports (T)',
+        'format': '${:,.2f}T',
+        'delta_color': 'normal',
+        'tick_format': '$.3s',
+    },
+    'imports': {
+        'label': 'Imports ⬅️',
+        'folder': 'imports',
+        'aggregate': 'sum',
+        'name': 'Imports',
+        'section_title': 'Imports',
+        'scale': 1e12, 'decimals': 2,
+        'chart_scale': 1e9, 'chart_decimals': 0, 'chart_multiplier': 1e9,
+        'kpi_col': 'Imports (T-int)',
+        'text_col': 'Imports (T)',
+        'format': '${:,.2f}T',
+        'delta_color': 'normal',
+        'tick_format': '$.3s',
+    },
+    'exports_per_capita': {
+        'label': 'Exports / Capita ➡️',
+        'derive': 'ratio',
+        'inputs': ('exports', 'population'),
+        'name': 'Exports per Capita',
+        'section_title': 'Exports per Capita',
+        'scale': 1e3, 'decimals': 1,
+        'chart_scale': 1e2, 'chart_decimals': 0, 'chart_multiplier': 1e2,
+        'kpi_col': 'Exports per Capita (k-int)',
+        'text_col': 'Exports per Capita (k)',
+        'format': '${:,.1f}k',
+        'delta_color': 'normal',
+        'tick_format': '$.2s',
+    },
+    'trade_balance': {
+        'label': 'Trade Balance 📦',
+        'folder': 'trade_balance',
+        'aggregate': 'gdp',
+        'name': 'Trade Balance',
+        'section_title': 'Trade Balance (% of GDP)',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 100, 'chart_decimals': 3, 'chart_multiplier': 1,
+        'kpi_col': 'Trade Balance (%)',
+        'text_col': 'Trade Balance (%-str)',
+        'format': '{:.1f}%',
+        'delta_color': 'normal',
+        'tick_format': '.1%',
+    },
+    'birth_rate': {
+        'label': 'Birth Rate 🍼',
+        'folder': 'birth_rate',
+        'aggregate': 'population',
+        'name': 'Birth Rate',
+        'section_title': 'Birth Rate (per 1,000 people)',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 1, 'chart_decimals': 1, 'chart_multiplier': 1,
+        'kpi_col': 'Birth Rate',
+        'text_col': None,
+        'format': '{:.1f}',
+        'delta_color': 'normal',
+        'tick_format': '.1f',
+    },
+    'death_rate': {
+        'label': 'Death Rate 💀',
+        'folder': 'death_rate',
+        'aggregate': 'population',
+        'name': 'Death Rate',
+        'section_title': 'Death Rate (per 1,000 people)',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 1, 'chart_decimals': 1, 'chart_multiplier': 1,
+        'kpi_col': 'Death Rate',
+        'text_col': None,
+        'format': '{:.1f}',
+        'delta_color': 'normal',
+        'tick_format': '.1f',
+    },
+    'life_expectancy': {
+        'label': 'Life Expectancy 🎂',
+        'folder': 'life_expectancy',
+        'aggregate': 'population',
+        'name': 'Life Expectancy',
+        'section_title': 'Life Expectancy',
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 1, 'chart_decimals': 1, 'chart_multiplier': 1,
+        'kpi_col': 'Life Expectancy',
+        'text_col': None,
+        'format': '{:.1f}',
+        'delta_color': 'normal',
+        'tick_format': '.1f',
+    },
+}
+
+# The rest of the World Bank indicators in constants.EXTRA_URLS_PER_COUNTRY,
+# all shown one of three ways.
+
+def percent_metric(key, label, name, section_title, delta_color='normal', aggregate='population'):
+    return {
+        'label': label,
+        'folder': key,
+        'aggregate': aggregate,
+        'name': name,
+        'section_title': section_title,
+        'scale': 1, 'decimals': 1,
+        'chart_scale': 100, 'chart_decimals': 3, 'chart_multiplier': 1,
+        'kpi_col': f'{name} (%)',
+        'text_col': f'{name} (%-str)',
+        'format': '{:.1f}%',
+        'delta_color': delta_color,
+        'tick_format': '.0%',
+        'on_demand': True,
+    }
+
+def scaled_metric(key, label, name, section_title, scale, unit, decimals=1, prefix='', delta_color='normal', aggregate='sum'):
+    # KPIs in thousands / trillions / ..., charts to a thousandth of that
+    return {
+        'label': label,
+        'folder': key,
+        'aggregate': aggregate,
+        'name': name,
+        'section_title': section_title,
+        'scale': scale, 'decimals': decimals,
+        'chart_scale': scale / 1e3, 'chart_decimals': 0, 'chart_multiplier': scale / 1e3,
+        'kpi_col': f'{name} ({unit}-int)',
+        'text_col': f'{name} ({unit})',
+        'format': f'{prefix}{{:,.{decimals}f}}{unit}',
+        'delta_color': delta_color,
+        'tick_format': f'{prefix}.2s',
+        'on_demand': True,
+    }
+
+def plain_metric(key, label, name, section_title, decimals=1, unit='', delta_color='normal', aggregate='population'):
+    return {
+        'label': label,
+        'folder': key,
+        'aggregate': aggregate,
+        'name': name,
+        'section_title': section_title,
+        'scale': 1, 'decimals': decimals,
+        'chart_scale': 1, 'chart_decimals': decimals, 'chart_multiplier': 1,
+        'kpi_col': name,
+        'text_col': None,
+        'format': f'{{:,.{decimals}f}}{unit}',
+        'delta_color': delta_color,
+        'tick_format': f',.{decimals}f',
+        'on_demand': True,
+    }
+
+METRICS.update({
+    'net_migration_rate': scaled_metric('net_migration_rate', 'Net Migration 🧳', 'Net Migration', 'Net Migration (people)', 1e3, 'k'),
+    'population_density': plain_metric('population_density', 'Population Density 🏙️', 'Population Density', 'Population Density (people per km²)', aggregate=None),
+    'urban_population': percent_metric('urban_population', 'Urban Population 🏙️', 'Urban Population', 'Urban Population (% of total)'),
+    'mortality_rate': plain_metric('mortality_rate', 'Child Mortality Rate 🩺', 'Child Mortality Rate', 'Under-5 Mortality Rate (per 1,000 live births)', delta_color='inverse'),
+    'fertility_rate': plain_metric('fertility_rate', 'Fertility Rate 👶', 'Fertility Rate', 'Fertility Rate (births per woman)', decimals=2),
+    'gini_index': plain_metric('gini_index', 'Gini Index ⚖️', 'Gini Index', 'Gini Index (income inequality)', delta_color='inverse'),
+    'hdi': plain_metric('hdi', 'Human Development Index 🎓', 'Human Development Index', 'Human Development Index', decimals=3),
+    'gni': scaled_metric('gni', 'GNI 💵', 'GNI', 'Annual Gross National Income', 1e12, 'T', decimals=2, prefix='$'),
+    'gni_per_capita': scaled_metric('gni_per_capita', 'GNI / Capita 💵', 'GNI per Capita', 'Annual GNI per Capita', 1e3, 'k', prefix='$', aggregate='population'),
+    'poverty_rate': percent_metric('poverty_rate', 'Poverty Rate 🥣', 'Poverty Rate', 'Poverty Rate ($2.15 a day, % of population)', delta_color='inverse'),
+    'education_expenditure': percent_metric('education_expenditure', 'Education Spending 📚', 'Education Spending', 'Education Spending (% of GDP)', aggregate='gdp'),
+    'health_expenditure': percent_metric('health_expenditure', 'Health Spending 🏥', 'Health Spending', 'Health Spending (% of GDP)', aggregate='gdp'),
+    'military_expenditure': percent_metric('military_expenditure', 'Military Spending 🪖', 'Military Spending', 'Military Spending (% of GDP)', aggregate='gdp'),
+    'internet_users': percent_metric('internet_users', 'Internet Users 🌐', 'Internet Users', 'Internet Users (% of population)'),
+    'mobile_subscriptions': plain_metric('mobile_subscriptions', 'Mobile Subscriptions 📱', 'Mobile Subscriptions', 'Mobile Subscriptions (per 100 people)', decimals=0),
+    'electricity_consumption': plain_metric('electricity_consumption', 'Electricity Use ⚡', 'Electricity Use', 'Electricity Use (kWh per person)', decimals=0, unit=' kWh'),
+    'co2_emissions': scaled_metric('co2_emissions', 'CO2 Emissions 🏭', 'CO2 Emissions', 'CO2 Emissions (megatonnes)', 1e3, 'Mt', delta_color='inverse'),
+    'forest_area': percent_metric('forest_area', 'Forest Area 🌲', 'Forest Area', 'Forest Area (% of land)', aggregate=None),
+    'arable_land': percent_metric('arable_land', 'Arable Land 🌾', 'Arable Land', 'Arable Land (% of land)', aggregate=None),
+    'cereal_yield': plain_metric('cereal_yield', 'Cereal Yield 🌽', 'Cereal Yield', 'Cereal Yield (kg per hectare)', decimals=0, unit=' kg/ha', aggregate=None),
+    'food_production_index': plain_metric('food_production_index', 'Food Production Index 🍎', 'Food Production Index', 'Food Production Index (2014-2016 = 100)'),
+})
+
+# scraped by every refresh, the rest only once somebody asks for them
+CORE_METRICS = tuple(key for key, spec in METRICS.items() if not spec.get('on_demand'))
+
+METRICS_BY_LABEL = {spec['label']: key for key, spec in METRICS.items()}
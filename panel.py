@@ -0,0 +1,60 @@
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+# Every metric on one dense (country x year x metric) grid of raw values, NaN
+# where the World Bank has nothing. Built once from the long metrics table, so
+# cross-metric views index into aligned arrays instead of merging frames on
+# (Country, Year): one metric is a 2-D slice, a ratio of two is a division.
+
+class Panel(NamedTuple):
+    values: np.ndarray
+    countries: pd.Index
+    years: np.ndarray
+    metrics: pd.Index
+    version: str = None
+
+def build_panel(table, metrics, version=None):
+    # `table` is long format with categorical Metric and Country columns
+    metric_positions = pd.Index(metrics).get_indexer(table['Metric'].cat.categories)[table['Metric'].cat.codes.to_numpy()]
+    keep = metric_positions >= 0
+    country = table['Country'].array
+    years = table['Year'].to_numpy()
+    first_year, last_year = (int(years.min()), int(years.max())) if len(years) else (0, -1)
+    values = np.full((len(country.categories), last_year - first_year + 1, len(metrics)), np.nan)
+    values[country.codes[keep], years[keep] - first_year, metric_positions[keep]] = table['Value'].to_numpy(dtype=float)[keep]
+    return Panel(values, pd.Index(country.categories), np.arange(first_year, last_year + 1), pd.Index(metrics), version)
+
+def year_range(panel, from_year, to_year):
+    return slice(max(0, from_year - panel.years[0]), max(0, to_year - panel.years[0] + 1))
+
+def select(panel, countries=None, metrics=None, from_year=None, to_year=None):
+    # a (countries x years x metrics) view of the cube, in the order asked for
+    rows = panel.countries.get_indexer(countries) if countries is not None else slice(None)
+    layers = panel.metrics.get_indexer(metrics) if metrics is not None else slice(None)
+    years = year_range(panel, from_year if from_year is not None else panel.years[0], to_year if to_year is not None else panel.years[-1])
+    cube = panel.values[rows][:, years][..., layers]
+    if countries is not None:
+        # a country with no data at all gets an all-NaN row
+        cube[np.asarray(rows) < 0] = np.nan
+    return cube, panel.years[years]
+
+def metric_grid(panel, metric):
+    # (countries x years) for one metric, a view into the cube
+    return panel.values[..., panel.metrics.get_loc(metric)]
+
+def latest_values(cube, years):
+    # the newest non-NaN value of each (country, metric) along the year axis and
+    # the year it's from, NaN / -1 where there's none
+    found = np.isfinite(cube)
+    last = cube.shape[1] - 1 - np.argmax(found[:, ::-1], axis=1)
+    has_value = found.any(axis=1)
+    values = np.take_along_axis(cube, last[:, None], axis=1)[:, 0]
+    return np.where(has_value, values, np.nan), np.where(has_value, years[last], -1)
+
+def correlation(x, y):
+    # Pearson r over the (country, year) cells where both are known
+    both = np.isfinite(x) & np.isfinite(y)
+    if both.sum() < 3:
+        return None
+    return float(np.corrcoef(x[both], y[both])[0, 1])
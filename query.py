@@ -0,0 +1,78 @@
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from frames import country_mask
+
+# A metric frame sorted by Country then Year (newest first), plus where each
+# country's rows start and stop. Selecting countries and a year range touches
+# only the selected rows instead of masking the whole table. `rankings` holds,
+# per year, the frame positions ordered by value so bar charts and the KPI
+# strip look their order up instead of sorting on every rerun.
+
+class IndexedMetric(NamedTuple):
+    frame: pd.DataFrame
+    slices: dict
+    years: np.ndarray
+    rankings: dict
+    version: str = None
+
+def build_rankings(frame, rank_by):
+    if not rank_by or not len(frame):
+        return {}
+    years = frame['Year'].to_numpy()
+    # lexsort's last key is the primary one: year, then each rank_by column descending
+    keys = [-frame[col].to_numpy(dtype=float) for col in reversed(rank_by)] + [years]
+    order = np.lexsort(keys)
+    sorted_years = years[order]
+    starts = np.flatnonzero(np.r_[True, sorted_years[1:] != sorted_years[:-1]])
+    return {
+        sorted_years[start].item(): positions
+        for start, positions in zip(starts, np.split(order, starts[1:]))
+    }
+
+def index_metric(metric_df, rank_by=None, version=None):
+    frame = metric_df.sort_values(
+        by=['Country', 'Year'], ascending=[True, False], kind='stable', ignore_index=True
+    )
+    # compare integer codes rather than the country strings
+    codes, countries = pd.factorize(frame['Country'])
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(frame) else np.array([], dtype=int)
+    stops = np.r_[starts[1:], len(frame)]
+    slices = {countries[codes[start]]: (start, stop) for start, stop in zip(starts, stops)}
+    return IndexedMetric(frame, slices, frame['Year'].to_numpy(), build_rankings(frame, rank_by), version)
+
+def year_bounds(indexed_metric, country, from_year, to_year):
+    start, stop = indexed_metric.slices[country]
+    # years run newest first inside a slice, so search the negated values
+    descending_years = -indexed_metric.years[start:stop]
+    return (
+        start + np.searchsorted(descending_years, -to_year, side='left'),
+        start + np.searchsorted(descending_years, -from_year, side='right'),
+    )
+
+def select_countries(indexed_metric, countries, from_year, to_year):
+    # returns the selected rows plus a per-country view of them, newest year first
+    bounds = [
+        (country, *year_bounds(indexed_metric, country, from_year, to_year))
+        for country in countries
+        if country in indexed_metric.slices
+    ]
+    positions = np.concatenate([np.arange(lo, hi) for _, lo, hi in bounds] or [np.array([], dtype=int)])
+    filtered_df = indexed_metric.frame.iloc[positions]
+    country_dfs = {}
+    offset = 0
+    for country, lo, hi in bounds:
+        country_dfs[country] = filtered_df.iloc[offset:offset + hi - lo]
+        offset += hi - lo
+    return filtered_df, country_dfs
+
+def max_year_in_range(country_dfs):
+    # each country's first row is its newest year in range
+    latest_years = [country_df['Year'].iat[0] for country_df in country_dfs.values() if len(country_df)]
+    return max(latest_years) if latest_years else None
+
+def ranked_rows(indexed_metric, year, countries):
+    # rows for `year`, highest value first, limited to `countries`
+    positions = indexed_metric.rankings.get(year, np.array([], dtype=int))
+    ranked_df = indexed_metric.frame.iloc[positions]
+    return ranked_df[country_mask(ranked_df['Country'], countries)]
@@ -0,0 +1,184 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from tenacity import Retrying, stop_after_attempt, wait_random_exponential, retry_if_exception_type, retry_if_result
+from transport import request_url
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# Requests per second across every worker, adjusted once per SCRAPE_RATE_WINDOW:
+# a window where more than SCRAPE_THROTTLE_SHARE of the answers were throttled
+# halves it, any other window grows it by SCRAPE_RATE_GROWTH. A real upstream
+# limit throttles most requests past it, so the rate settles just under that,
+# while the odd stray 429 doesn't drag it down.
+SCRAPE_RATE = config('SCRAPE_RATE', default=50.0, cast=float)
+SCRAPE_MIN_RATE = config('SCRAPE_MIN_RATE', default=1.0, cast=float)
+SCRAPE_MAX_RATE = config('SCRAPE_MAX_RATE', default=200.0, cast=float)
+SCRAPE_RATE_WINDOW = config('SCRAPE_RATE_WINDOW', default=1.0, cast=float)  # seconds
+SCRAPE_THROTTLE_SHARE = config('SCRAPE_THROTTLE_SHARE', default=0.2, cast=float)
+SCRAPE_RATE_GROWTH = config('SCRAPE_RATE_GROWTH', default=1.5, cast=float)
+# attempts per request, with jittered exponential backoff in between (seconds),
+# or exactly the Retry-After the API asked for
+SCRAPE_RETRIES = config('SCRAPE_RETRIES', default=5, cast=int)
+SCRAPE_BACKOFF_BASE = config('SCRAPE_BACKOFF_BASE', default=0.5, cast=float)
+SCRAPE_BACKOFF_MAX = config('SCRAPE_BACKOFF_MAX', default=30.0, cast=float)
+
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_throttled(response):
+    # a 503 is only the API asking us to slow down when it says for how long
+    return response.status_code == 429 or (
+        response.status_code in THROTTLE_STATUSES and retry_after_seconds(response) is not None
+    )
+
+class AdaptiveTokenBucket:
+    def __init__(self, rate=SCRAPE_RATE, burst=1, min_rate=SCRAPE_MIN_RATE, max_rate=SCRAPE_MAX_RATE,
+                 window=SCRAPE_RATE_WINDOW, throttle_share=SCRAPE_THROTTLE_SHARE, growth=SCRAPE_RATE_GROWTH):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.window = window
+        self.throttle_share = throttle_share
+        self.growth = growth
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.window_start = self.updated
+        self.window_answers = 0
+        self.window_throttled = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def _on_answer(self, throttled):
+        # called with the lock held
+        now = time.monotonic()
+        self.window_answers += 1
+        self.window_throttled += throttled
+        if now - self.window_start < self.window:
+            return
+        if self.window_throttled > self.throttle_share * self.window_answers:
+            self.rate = max(self.min_rate, self.rate / 2)
+        else:
+            self.rate = min(self.max_rate, self.rate * self.growth)
+        self.window_start = now
+        self.window_answers = 0
+        self.window_throttled = 0
+
+    def on_success(self):
+        with self.lock:
+            self._on_answer(throttled=False)
+
+    def on_throttle(self):
+        # the request that was throttled waits out its Retry-After on its own,
+        # the others only slow down through the rate
+        with self.lock:
+            self.throttled += 1
+            self._on_answer(throttled=True)
+
+class ScheduledSession:
+    # Rate limits and retries every get() of the wrapped session, and remembers
+    # the requests that still failed once the retries ran out.
+    def __init__(self, session, limiter=None, attempts=SCRAPE_RETRIES, backoff_base=SCRAPE_BACKOFF_BASE, backoff_max=SCRAPE_BACKOFF_MAX):
+        self.session = session
+        self.limiter = limiter
+        self.attempts = attempts
+        self.backoff = wait_random_exponential(multiplier=backoff_base, max=backoff_max)
+        self.backoff_max = backoff_max
+        self.failures = {}
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def _get(self, url, params=None, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        response = self.session.get(url, params=params, **kwargs)
+        if self.limiter is not None:
+            if is_throttled(response):
+                self.limiter.on_throttle()
+            elif response.status_code < 500:
+                self.limiter.on_success()
+        return response
+
+    def _wait(self, retry_state):
+        outcome = retry_state.outcome
+        if not outcome.failed:
+            retry_after = retry_after_seconds(outcome.result())
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return self.backoff(retry_state)
+
+    def _before_sleep(self, retry_state):
+        with self.lock:
+            self.retries += 1
+        outcome = retry_state.outcome
+        reason = outcome.exception() if outcome.failed else outcome.result().status_code
+        logger.info(f'Retrying {retry_state.args[0]} in {retry_state.next_action.sleep:.1f}s ({reason}) 🔁')
+
+    def get(self, url, params=None, **kwargs):
+        retrying = Retrying(
+            stop=stop_after_attempt(self.attempts),
+            wait=self._wait,
+            retry=retry_if_exception_type(TRANSIENT_ERRORS) | retry_if_result(lambda r: r.status_code in RETRY_STATUSES),
+            before_sleep=self._before_sleep,
+            # out of attempts: hand back the last response (or raise the last
+            # error) so the caller's raise_for_status handling still applies
+            retry_error_callback=lambda retry_state: retry_state.outcome.result(),
+        )
+        try:
+            response = retrying(self._get, url, params, **kwargs)
+        except requests.exceptions.RequestException as err:
+            self._fail(url, params, type(err).__name__)
+            raise
+        if response.status_code >= 400:
+            self._fail(url, params, f'{response.status_code} {response.reason}')
+        return response
+
+    def _fail(self, url, params, reason):
+        with self.lock:
+            self.failures[request_url(url, params)] = reason
+
+    def stats(self):
+        stats = {'retries': self.retries, 'failures': len(self.failures)}
+        if self.limiter is not None:
+            stats.update({'throttled': self.limiter.throttled, 'rate': round(self.limiter.rate, 1)})
+        return stats
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
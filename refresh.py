@@ -0,0 +1,170 @@
+import datetime
+import os
+import shutil
+import threading
+import time
+from constants import CORE_URLS_PER_COUNTRY
+from metrics import CORE_METRICS
+import store
+import catalog
+from scrape import scrape_core_metrics_for_core_countries
+from get_data import write_snapshot, is_stored, SNAPSHOT_FILE, SNAPSHOT_VERSIONS_FILE
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# Scrapes run here, out of band: each refresh stages a copy of the live version,
+# scrapes into it incrementally and publishes it with store.publish_version.
+# The app keeps serving the old version until the new one is loaded.
+#
+# Usage: python refresh.py               (one refresh)
+#        python refresh.py --every 24    (keep refreshing every 24 hours)
+REFRESH_INTERVAL_HOURS = config('REFRESH_INTERVAL_HOURS', default=0.0, cast=float)  # 0 = no in-app scheduler
+REFRESH_KEEP_VERSIONS = config('REFRESH_KEEP_VERSIONS', default=3, cast=int)
+# a lock older than this is left over from a crashed refresh
+REFRESH_LOCK_TIMEOUT_HOURS = config('REFRESH_LOCK_TIMEOUT_HOURS', default=2.0, cast=float)
+
+_refresh_thread = None
+_refresh_thread_lock = threading.Lock()
+
+def new_version_id():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+
+def refresh_lock_path(root):
+    return f'{root}/refresh.lock'
+
+def acquire_refresh_lock(root):
+    # one refresh at a time across every process sharing ./data
+    path = refresh_lock_path(root)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) > REFRESH_LOCK_TIMEOUT_HOURS * 3600:
+        logger.warning(f'Removing stale {path} 🧹')
+        os.remove(path)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return path
+
+def link_or_copy(src, dst):
+    # parquet and manifest files are only ever replaced (tmp + os.replace), so
+    # the new version can share them with the old one until they change
+    if src.endswith(('.parquet', '.json')):
+        os.link(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+def stage_version(staging_dir, root='./data'):
+    live_dir = store.live_data_dir(root)
+    os.makedirs(staging_dir)
+    for entry in os.listdir(live_dir):
+        src = f'{live_dir}/{entry}'
+        if entry in (SNAPSHOT_FILE, SNAPSHOT_VERSIONS_FILE):
+            continue  # rebuilt once the scrape is done
+        if entry.endswith('.parquet') or entry == 'manifest.json':
+            link_or_copy(src, f'{staging_dir}/{entry}')
+        elif os.path.isdir(src) and entry != 'versions' and any(f.endswith('.csv') for f in os.listdir(src)):
+            shutil.copytree(src, f'{staging_dir}/{entry}', copy_function=link_or_copy)
+
+def prune_versions(root='./data', keep=REFRESH_KEEP_VERSIONS):
+    live = store.current_version(root)
+    versions = sorted(
+        entry for entry in os.listdir(f'{root}/versions')
+        if not entry.endswith('.staging') and entry != live
+    )
+    for version in versions[:max(0, len(versions) - (keep - 1))]:
+        shutil.rmtree(store.version_dir(version, root), ignore_errors=True)
+
+def stored_versions(data_dir):
+    # metric -> store version of every series in a data dir
+    names = {
+        entry[:-len('.parquet')] if entry.endswith('.parquet') else entry
+        for entry in os.listdir(data_dir)
+        if entry.endswith('.parquet')
+        or (os.path.isdir(f'{data_dir}/{entry}') and any(f.endswith('.csv') for f in os.listdir(f'{data_dir}/{entry}')))
+    }
+    return {name: store.metric_version(name, data_dir) for name in names}
+
+def write_new_version(write, root='./data'):
+    # Stages a copy of the live version, lets `write(staging_dir)` change it and
+    # publishes the result. Nothing is published when another refresh holds the
+    # lock, when `write` returns False or when no series actually changed; the
+    # staging dir is removed whatever happens. Returns the published version.
+    os.makedirs(root, exist_ok=True)
+    lock = acquire_refresh_lock(root)
+    if lock is None:
+        logger.info('A refresh is already running, skipping ⏭️')
+        return None
+    version = new_version_id()
+    staging_dir = f'{store.version_dir(version, root)}.staging'
+    try:
+        stage_version(staging_dir, root)
+        before = stored_versions(staging_dir)
+        if write(staging_dir) is False:
+            return None
+        if stored_versions(staging_dir) == before:
+            # every process would drop its caches and reload the same data
+            logger.info('No series changed, keeping the live version ⏭️')
+            return None
+        if all(is_stored(metric, staging_dir) for metric in CORE_METRICS):
+            write_snapshot(staging_dir)
+        else:
+            # e.g. a first bulk import of a few metrics: the loaders read the store itself
+            logger.info('Not every core metric is stored yet, publishing without a snapshot 📭')
+        os.rename(staging_dir, store.version_dir(version, root))
+        store.publish_version(version, root)
+        prune_versions(root)
+        return version
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.remove(lock)
+
+def refresh_data(root='./data', urls=CORE_URLS_PER_COUNTRY, **scrape_kwargs):
+    def scrape(staging_dir):
+        logger.info(f'Refreshing data into {staging_dir} 🔄')
+        # catalog metrics somebody has opened are kept up to date too
+        scrape_urls = {**catalog.fetched_urls(staging_dir), **urls}
+        scrape_core_metrics_for_core_countries(urls=scrape_urls, data_dir=staging_dir, incremental=True, **scrape_kwargs)
+        missing = [metric for metric in urls if not store.metric_exists(metric, staging_dir)]
+        if missing:
+            # keep serving what we have rather than publish a version with holes
+            logger.error(f'Not publishing {staging_dir}, no data for {missing} ❌')
+            return False
+    return write_new_version(scrape, root)
+
+def request_refresh(root='./data'):
+    # kick off a refresh without waiting on it, at most one per process at a time
+    global _refresh_thread
+    with _refresh_thread_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return _refresh_thread
+        _refresh_thread = threading.Thread(target=refresh_data, args=(root,), name='data-refresh', daemon=True)
+        _refresh_thread.start()
+        return _refresh_thread
+
+def run_every(hours, root='./data'):
+    while True:
+        try:
+            refresh_data(root)
+        except Exception:
+            logger.exception('Refresh failed, will try again next time ❌')
+        time.sleep(hours * 3600)
+
+def start_scheduler(hours=REFRESH_INTERVAL_HOURS, root='./data'):
+    thread = threading.Thread(target=run_every, args=(hours, root), name='data-refresh-scheduler', daemon=True)
+    thread.start()
+    logger.info(f'Refreshing data every {hours:g}h in the background ⏰')
+    return thread
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Scrape into a new data version and publish it')
+    parser.add_argument('--root', default='./data')
+    parser.add_argument('--every', type=float, metavar='HOURS', help='keep refreshing on this cadence')
+    args = parser.parse_args()
+    if args.every:
+        run_every(args.every, args.root)
+    else:
+        refresh_data(args.root)
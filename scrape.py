@@ -1,52 +1,282 @@
 import requests
-from constants import CORE_URLS_PER_COUNTRY, CORE_COUNTRIES_TO_SCRAPE_INITIALLY, COUNTRY_CODES_W_FLAGS
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from constants import CORE_URLS_PER_COUNTRY, CORE_URLS_ALL_COUNTRIES, CORE_COUNTRIES_TO_SCRAPE_INITIALLY, COUNTRY_CODES_W_FLAGS
+import store
+from transport import TransportSession, SCRAPE_TRANSPORT, CASSETTE_DIR, WORLDBANK_BASE_URL, WORLDBANK_URL
+from ratelimit import ScheduledSession, AdaptiveTokenBucket
 import coloredlogs, logging
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
 import os
+import json
+import hashlib
 from decouple import config
 logger = logging.getLogger(__name__)
 coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
 
-def get_data_per_country(country: str, url :str) -> pd.DataFrame:
-    try:
-        logger.info(f'Getting page 1 of {country} - url: {url}...')
-        response = requests.get(url.format(country=country))
+SCRAPE_CONCURRENCY = config('SCRAPE_CONCURRENCY', default=8, cast=int)
+# Rows per page: big enough that a country's series is a single request, and
+# the all-countries bulk download stays a handful of pages. The raw JSON of one
+# page at a time is held, so the bulk page size is also its memory high-water mark.
+PER_PAGE = config('PER_PAGE', default=1000, cast=int)
+BULK_PER_PAGE = config('BULK_PER_PAGE', default=20000, cast=int)
+
+def get_session(pool_size: int = SCRAPE_CONCURRENCY, transport: str = SCRAPE_TRANSPORT, cassette_dir: str = CASSETTE_DIR):
+    # one keep-alive connection pool shared by every worker
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if transport != 'live' or WORLDBANK_BASE_URL != WORLDBANK_URL:
+        logger.info(f'Using the {transport} transport ({cassette_dir if transport != "live" else WORLDBANK_BASE_URL}) 📼')
+        session = TransportSession(session, mode=transport, cassette_dir=cassette_dir)
+    if transport == 'replay':
+        # recorded failures would only fail again, and there's nothing to throttle
+        return ScheduledSession(session, attempts=1)
+    return ScheduledSession(session, AdaptiveTokenBucket(burst=pool_size))
+
+def log_failure_summary(session):
+    logger.info(f'Requests: {session.stats()} 📊')
+    if not session.failures:
+        return
+    logger.warning(f'{len(session.failures)} requests failed permanently ❌')
+    for url, reason in sorted(session.failures.items()):
+        logger.warning(f'  {reason}: {url}')
+
+def load_manifest(data_dir='./data') -> dict:
+    path = f'{data_dir}/manifest.json'
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest: dict, data_dir='./data'):
+    path = f'{data_dir}/manifest.json'
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+def probe_series(url: str, session: requests.Session = None) -> dict:
+    # a single-row page is enough to read the series metadata
+    http = session if session is not None else requests
+    response = http.get(url, params={'per_page': 1})
+    response.raise_for_status()
+    meta = response.json()[0]
+    return {
+        'lastupdated': meta.get('lastupdated'),
+        'total': meta.get('total'),
+    }
+
+def is_unchanged(entry, probe, stored):
+    return (
+        entry is not None
+        and stored
+        and entry.get('lastupdated') == probe['lastupdated']
+        and entry.get('total') == probe['total']
+    )
+
+def content_hash(df: pd.DataFrame) -> str:
+    return hashlib.sha256(df.to_csv(index=False).encode()).hexdigest()
+
+def iter_pages(url: str, session: requests.Session = None, per_page: int = PER_PAGE, label: str = ''):
+    # yields the rows of one page at a time, the previous page is garbage by then
+    http = session if session is not None else requests
+    page, pages = 1, 1
+    while page <= pages:
+        logger.info(f'Getting page {page} of {label} - url: {url}...')
+        response = http.get(url, params={'per_page': per_page, 'page': page})
         response.raise_for_status()
         data = response.json()
-        df = pd.DataFrame(data[1])
-        if data[0]['pages'] > 1:
-            for page in range(2, data[0]['pages'] + 1):
-                logger.info(f'Getting page {page} of {country} - url: {url}...')
-                response = requests.get(url.format(country=country), params={'page': page})
-                response.raise_for_status()
-                data = response.json()
-                df = pd.concat([df, pd.DataFrame(data[1])])
-        return df
-    except requests.exceptions.HTTPError as err:
+        if len(data) < 2:
+            # the API answers bad requests with a 200 and a lone message
+            logger.warning(f'No rows for {label}: {data[0]}')
+            return
+        pages = data[0]['pages']
+        yield data[1] or []
+        page += 1
+
+def read_series(url: str, session: requests.Session = None, per_page: int = PER_PAGE, label: str = '') -> pd.DataFrame:
+    # Each page is cut down to the fields the store needs as it arrives: one
+    # shared str per country code and year, and the values as float64. The
+    # series still builds up in memory (the store rewrites a metric's file
+    # whole), but at ~24 bytes a row rather than three objects per row.
+    shared = {}
+    codes, dates, values = [], [], []
+    for rows in iter_pages(url, session, per_page, label):
+        codes.append(np.array([shared.setdefault(row['countryiso3code'], row['countryiso3code']) for row in rows], dtype=object))
+        dates.append(np.array([shared.setdefault(row['date'], row['date']) for row in rows], dtype=object))
+        values.append(np.array([row['value'] for row in rows], dtype='float64'))
+    return pd.DataFrame({
+        'countryiso3code': np.concatenate(codes) if codes else np.array([], dtype=object),
+        'date': np.concatenate(dates) if dates else np.array([], dtype=object),
+        'value': np.concatenate(values) if values else np.array([], dtype='float64'),
+    })
+
+def get_data_per_country(country: str, url :str, session: requests.Session = None, per_page: int = PER_PAGE) -> pd.DataFrame:
+    try:
+        return read_series(url.format(country=country), session, per_page, label=country)
+    except requests.exceptions.RequestException as err:
+        logger.error(err)
+        return None
+
+def get_data_all_countries(url: str, per_page: int = BULK_PER_PAGE, session: requests.Session = None) -> pd.DataFrame:
+    try:
+        return read_series(url, session, per_page, label='all countries')
+    except requests.exceptions.RequestException as err:
         logger.error(err)
         return None
 
-def scrape_core_metrics_for_core_countries():
+def fetch_metric_for_all_countries(metric, url, countries=None, session=None, per_page=BULK_PER_PAGE, manifest=None, stored=False):
+    logger.info(f'Getting data for {metric} - all countries...')
+    if manifest is not None:
+        key = f'{metric}/all'
+        try:
+            probe = probe_series(url, session=session)
+        except requests.exceptions.RequestException as err:
+            logger.error(err)
+            return {}
+        if is_unchanged(manifest.get(key), probe, stored):
+            logger.info(f'{metric} is unchanged since {probe["lastupdated"]}, skipping ⏭️')
+            return {}
+    df = get_data_all_countries(url, per_page=per_page, session=session)
+    if df is None:
+        logger.warning(f'No data found for {metric} ❌')
+        return {}
+    if manifest is not None:
+        manifest[key] = probe
+    # some aggregates come back without an iso3 code, they can't be keyed so drop them
+    df = df[df['countryiso3code'].fillna('') != '']
+    if countries is not None:
+        df = df[df['countryiso3code'].isin(countries)]
+    return dict(tuple(df.groupby('countryiso3code', sort=False)))
+
+def fetch_metric_for_country(metric, country, url, session=None, manifest=None, stored=False):
+    logger.info(f'Getting data for {metric} - {country}...')
+    if manifest is not None:
+        key = f'{metric}/{country}'
+        try:
+            probe = probe_series(url.format(country=country), session=session)
+        except requests.exceptions.RequestException as err:
+            logger.error(err)
+            return None
+        if is_unchanged(manifest.get(key), probe, stored):
+            logger.info(f'{key} is unchanged since {probe["lastupdated"]}, skipping ⏭️')
+            return None
+    df = get_data_per_country(country, url, session=session)
+    if df is None:
+        logger.warning(f'No data found for {COUNTRY_CODES_W_FLAGS.get(country, country)} ❌')
+        return None
+    if manifest is not None:
+        digest = content_hash(df)
+        unchanged = manifest.get(key, {}).get('sha256') == digest and stored
+        manifest[key] = {**probe, 'sha256': digest}
+        if unchanged:
+            logger.info(f'{key} content is unchanged, not rewriting ⏭️')
+            return None
+    return df
+
+def scrape_core_metrics_for_core_countries(
+        concurrency=SCRAPE_CONCURRENCY,
+        urls=CORE_URLS_PER_COUNTRY,
+        countries=CORE_COUNTRIES_TO_SCRAPE_INITIALLY,
+        data_dir='./data',
+        incremental=False,
+        transport=SCRAPE_TRANSPORT,
+        cassette_dir=CASSETTE_DIR
+    ):
     logger.info('Getting core metrics for core countries...')
-    if not os.path.exists('./data'):
-        os.makedirs('./data')
-    for metric in tqdm(CORE_URLS_PER_COUNTRY):
-        metric_folder_path = f'./data/{metric}'
-        if not os.path.exists(metric_folder_path):
-            os.mkdir(metric_folder_path)
-        logger.info(f'Getting data for {metric}...')
-        for country in CORE_COUNTRIES_TO_SCRAPE_INITIALLY:
-            logger.info(f'Getting data for {country}...')
-            df = get_data_per_country(country, CORE_URLS_PER_COUNTRY[metric])
-            if df is None:
-                logger.warning(f'No data found for {COUNTRY_CODES_W_FLAGS[country]} ❌')
-                continue
-            else:
-                df.to_csv(f'{metric_folder_path}/{country}.csv', index=False)
-                logger.info(f'Saved {metric_folder_path}/{country}.csv 💾')
-        logger.info(f'Done getting data for {metric}! ✅')
+    os.makedirs(data_dir, exist_ok=True)
+    manifest = load_manifest(data_dir) if incremental else None
+    stored = {metric: store.list_countries(metric, data_dir) for metric in urls} if incremental else {}
+    jobs = [(metric, country) for metric in urls for country in countries]
+    # each metric is written to the store as soon as its last country comes back
+    pending = {metric: len(countries) for metric in urls}
+    frames = {metric: {} for metric in urls}
+    written = 0
+
+    def collect(metric, country, df):
+        nonlocal written
+        if df is not None:
+            frames[metric][country] = df
+        pending[metric] -= 1
+        if pending[metric] == 0:
+            written += len(frames[metric])
+            store.write_series(metric, frames.pop(metric), data_dir)
+            logger.info(f'Done getting data for {metric}! ✅')
+
+    with get_session(max(1, concurrency), transport, cassette_dir) as session:
+        if concurrency <= 1:
+            for metric, country in tqdm(jobs):
+                df = fetch_metric_for_country(
+                    metric, country, urls[metric], session,
+                    manifest=manifest, stored=country in stored.get(metric, ())
+                )
+                collect(metric, country, df)
+        else:
+            logger.info(f'Scraping with {concurrency} workers 🧵')
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = {
+                    pool.submit(
+                        fetch_metric_for_country, metric, country, urls[metric],
+                        session, manifest, country in stored.get(metric, ())
+                    ): (metric, country)
+                    for metric, country in jobs
+                }
+                for future in tqdm(as_completed(futures), total=len(futures)):
+                    collect(*futures[future], future.result())
+    if manifest is not None:
+        save_manifest(manifest, data_dir)
+        logger.info(f'Rewrote {written} of {len(jobs)} series 🔁')
+    log_failure_summary(session)
     logger.info('Done getting all core metrics for core countries! ✅ 🎉')
+    return session.failures
+
+def scrape_core_metrics_for_all_countries(
+        concurrency=SCRAPE_CONCURRENCY,
+        urls=CORE_URLS_ALL_COUNTRIES,
+        countries=None,
+        data_dir='./data',
+        per_page=BULK_PER_PAGE,
+        incremental=False,
+        transport=SCRAPE_TRANSPORT,
+        cassette_dir=CASSETTE_DIR
+    ):
+    # one paginated request chain per metric instead of one per (metric, country),
+    # `countries=None` keeps every economy the API returns
+    logger.info('Getting core metrics for all countries...')
+    os.makedirs(data_dir, exist_ok=True)
+    manifest = load_manifest(data_dir) if incremental else None
+    workers = max(1, min(concurrency, len(urls)))
+    with get_session(workers, transport, cassette_dir) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                fetch_metric_for_all_countries, metric, urls[metric], countries, session, per_page,
+                manifest, incremental and store.metric_exists(metric, data_dir)
+            ): metric
+            for metric in urls
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            store.write_series(futures[future], future.result(), data_dir)
+    if manifest is not None:
+        save_manifest(manifest, data_dir)
+    log_failure_summary(session)
+    logger.info('Done getting all core metrics for all countries! ✅ 🎉')
+    return session.failures
 
 if __name__ == '__main__':
-    scrape_core_metrics_for_core_countries()
\ No newline at end of file
+    import argparse
+    import refresh
+    parser = argparse.ArgumentParser(description='Scrape World Bank indicators into a new data version and publish it')
+    parser.add_argument('--root', default='./data')
+    parser.add_argument('--all-countries', action='store_true', help='bulk-download every economy per metric')
+    parser.add_argument('--incremental', action='store_true', help='only re-download series the World Bank has updated')
+    parser.add_argument('--transport', choices=['live', 'record', 'replay'], default=SCRAPE_TRANSPORT,
+                        help='record responses to, or replay them from, --cassette-dir')
+    parser.add_argument('--cassette-dir', default=CASSETTE_DIR)
+    args = parser.parse_args()
+    options = dict(incremental=args.incremental, transport=args.transport, cassette_dir=args.cassette_dir)
+    scrape_metrics = scrape_core_metrics_for_all_countries if args.all_countries else scrape_core_metrics_for_core_countries
+    # readers only see a published version, see refresh.py
+    refresh.write_new_version(lambda data_dir: scrape_metrics(data_dir=data_dir, **options), args.root)
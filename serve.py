@@ -0,0 +1,17 @@
+import sys
+import threading
+from streamlit.web import cli
+import get_data
+import charts
+
+# Starts the dashboard with its caches warming in the background, so the first
+# visitor after a deploy doesn't pay for the loads. Streamlit runs the app in
+# this same process, so the metrics loaded here are the ones it serves.
+#
+# Usage: python serve.py [streamlit run options], e.g. python serve.py --server.port 8501
+
+if __name__ == '__main__':
+    get_data.prewarm()
+    threading.Thread(target=charts.warm_up, name='plotly-warm-up', daemon=True).start()
+    sys.argv = ['streamlit', 'run', 'streamlit_app.py', *sys.argv[1:]]
+    sys.exit(cli.main())
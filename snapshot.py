@@ -0,0 +1,35 @@
+import store
+import refresh
+from get_data import write_snapshot
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# Build step for deploys: leaves ./data ready to serve, scraped and with the
+# fully transformed metrics table written next to it, so a new container never
+# scrapes or runs the loaders for its first visitor. Pair with serve.py.
+#
+# Usage: python snapshot.py            (snapshot what's in ./data, scraping only if it's empty)
+#        python snapshot.py --refresh  (scrape a fresh version first)
+
+def build_snapshot(root='./data', fresh=False):
+    live_dir = store.live_data_dir(root)
+    if fresh or not store.metric_exists('gdp', live_dir):
+        # a refresh writes the snapshot into the version it publishes
+        if refresh.refresh_data(root) is not None:
+            return store.live_data_dir(root)
+        # nothing published: either nothing changed or the refresh failed
+        live_dir = store.live_data_dir(root)
+        if not store.metric_exists('gdp', live_dir):
+            raise SystemExit('Refresh failed, no snapshot built ❌')
+    write_snapshot(live_dir)
+    return live_dir
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Build a ready-to-serve data snapshot')
+    parser.add_argument('--root', default='./data')
+    parser.add_argument('--refresh', action='store_true', help='scrape a new data version before snapshotting')
+    args = parser.parse_args()
+    logger.info(f'Snapshot ready in {build_snapshot(args.root, args.refresh)} ✅')
@@ -0,0 +1,161 @@
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# 'parquet' keeps one compressed file per metric (./data/<metric>.parquet),
+# 'csv' keeps the original one-file-per-country layout (./data/<metric>/<country>.csv)
+STORAGE_BACKEND = config('STORAGE_BACKEND', default='parquet')
+
+# the only fields of a World Bank row the loaders ever use
+STORE_COLUMNS = ['countryiso3code', 'date', 'value']
+STORE_SCHEMA = pa.schema([
+    ('countryiso3code', pa.string()),
+    ('date', pa.int16()),
+    ('value', pa.float64()),
+])
+
+# Published data lives in ./data/versions/<version>/ and ./data/CURRENT names the
+# live one. A refresh writes a whole new version and then swaps the pointer, so
+# readers never see a half-written dataset. Without a pointer ./data itself is live.
+CURRENT_POINTER = 'CURRENT'
+
+def version_dir(version, root='./data'):
+    return f'{root}/versions/{version}'
+
+def current_version(root='./data'):
+    try:
+        with open(f'{root}/{CURRENT_POINTER}') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def live_data_dir(root='./data'):
+    version = current_version(root)
+    return version_dir(version, root) if version else root
+
+def data_root(data_dir):
+    # the root a data dir belongs to: ./data for ./data/versions/<version>
+    parent = os.path.dirname(data_dir)
+    return os.path.dirname(parent) if os.path.basename(parent) == 'versions' else data_dir
+
+def publish_version(version, root='./data'):
+    path = f'{root}/{CURRENT_POINTER}'
+    with open(f'{path}.tmp', 'w') as f:
+        f.write(version)
+    os.replace(f'{path}.tmp', path)
+    logger.info(f'Published data version {version} 🚀')
+
+def parquet_path(metric, data_dir='./data'):
+    return f'{data_dir}/{metric}.parquet'
+
+def csv_folder(metric, data_dir='./data'):
+    return f'{data_dir}/{metric}'
+
+def metric_exists(metric, data_dir='./data'):
+    return os.path.exists(parquet_path(metric, data_dir)) or os.path.exists(csv_folder(metric, data_dir))
+
+def metric_version(metric, data_dir='./data'):
+    # changes whenever the stored series is rewritten
+    path = parquet_path(metric, data_dir)
+    if os.path.exists(path):
+        stat = os.stat(path)
+        return f'{stat.st_mtime_ns}-{stat.st_size}'
+    folder = csv_folder(metric, data_dir)
+    if not os.path.exists(folder):
+        return None
+    stats = [os.stat(f'{folder}/{file}') for file in os.listdir(folder) if file.endswith('.csv')]
+    return f'{max((stat.st_mtime_ns for stat in stats), default=0)}-{len(stats)}'
+
+def to_store_frame(df: pd.DataFrame) -> pd.DataFrame:
+    store_df = pd.DataFrame({
+        'countryiso3code': df['countryiso3code'].astype(str),
+        'date': pd.to_numeric(df['date']).astype('int16'),
+        'value': pd.to_numeric(df['value']).astype('float64'),
+    })
+    return store_df.sort_values(['countryiso3code', 'date'], ascending=[True, False], ignore_index=True)
+
+def check_writable(data_dir):
+    # once a version is published readers never look at the root again, so
+    # anything written there would be silently ignored
+    if os.path.exists(f'{data_dir}/{CURRENT_POINTER}'):
+        raise RuntimeError(f'{data_dir} has published versions, write into a new one with refresh.write_new_version')
+
+def write_parquet(metric, df: pd.DataFrame, data_dir='./data'):
+    check_writable(data_dir)
+    os.makedirs(data_dir, exist_ok=True)
+    path = parquet_path(metric, data_dir)
+    table = pa.Table.from_pandas(to_store_frame(df), schema=STORE_SCHEMA, preserve_index=False)
+    pq.write_table(table, f'{path}.tmp', compression='zstd', use_dictionary=['countryiso3code'])
+    os.replace(f'{path}.tmp', path)
+
+def read_metric(metric, columns=STORE_COLUMNS, data_dir='./data') -> pd.DataFrame:
+    path = parquet_path(metric, data_dir)
+    if os.path.exists(path):
+        return pd.read_parquet(path, columns=columns)
+    # fall back to a folder that hasn't been migrated yet
+    folder = csv_folder(metric, data_dir)
+    dfs = [
+        pd.read_csv(f'{folder}/{file}', usecols=columns)
+        for file in os.listdir(folder)
+        if file.endswith('.csv')
+    ]
+    return pd.concat(dfs)
+
+def list_countries(metric, data_dir='./data') -> set:
+    path = parquet_path(metric, data_dir)
+    if os.path.exists(path):
+        return set(pd.read_parquet(path, columns=['countryiso3code'])['countryiso3code'])
+    folder = csv_folder(metric, data_dir)
+    if not os.path.exists(folder):
+        return set()
+    return {file[:-4] for file in os.listdir(folder) if file.endswith('.csv')}
+
+def write_series(metric, frames: dict, data_dir='./data', backend=None):
+    # `frames` maps country -> raw World Bank rows for that country
+    check_writable(data_dir)
+    backend = backend or STORAGE_BACKEND
+    if not frames:
+        return
+    if backend == 'csv':
+        os.makedirs(csv_folder(metric, data_dir), exist_ok=True)
+        for country, df in frames.items():
+            df.to_csv(f'{csv_folder(metric, data_dir)}/{country}.csv', index=False)
+        logger.info(f'Saved {len(frames)} series to {csv_folder(metric, data_dir)} 💾')
+        return
+    new_df = pd.concat([df[STORE_COLUMNS] for df in frames.values()])
+    path = parquet_path(metric, data_dir)
+    if os.path.exists(path):
+        old_df = pd.read_parquet(path)
+        new_df = pd.concat([old_df[~old_df['countryiso3code'].isin(frames.keys())], new_df])
+    write_parquet(metric, new_df, data_dir)
+    logger.info(f'Saved {len(frames)} series to {path} 💾')
+
+def migrate_csv_folders(data_dir='./data', remove=False):
+    for entry in sorted(os.listdir(data_dir)):
+        folder = f'{data_dir}/{entry}'
+        if not os.path.isdir(folder) or not any(f.endswith('.csv') for f in os.listdir(folder)):
+            continue
+        before = sum(os.path.getsize(f'{folder}/{f}') for f in os.listdir(folder))
+        write_parquet(entry, read_metric(entry, data_dir=data_dir), data_dir)
+        after = os.path.getsize(parquet_path(entry, data_dir))
+        logger.info(f'Migrated {folder} ({before / 1e3:,.0f}kB) -> {parquet_path(entry, data_dir)} ({after / 1e3:,.0f}kB) ✅')
+        if remove:
+            shutil.rmtree(folder)
+
+if __name__ == '__main__':
+    import argparse
+    import refresh
+    parser = argparse.ArgumentParser(description='Manage the ./data metric store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='convert <metric>/*.csv folders to parquet, in a new published version')
+    migrate.add_argument('--root', default='./data')
+    migrate.add_argument('--remove', action='store_true', help='leave the csv folders out of the new version')
+    args = parser.parse_args()
+    if args.command == 'migrate':
+        refresh.write_new_version(lambda data_dir: migrate_csv_folders(data_dir, remove=args.remove), args.root)
@@ -1,25 +1,19 @@
+import numpy as np
+import pandas as pd
 import streamlit as st
-from plotly import express as px
-from constants import COUNTRY_CODES_W_FLAGS
+from constants import COUNTRY_CODES_W_FLAGS, COUNTRY_GROUP_LABELS, DEFAULT_COUNTRIES
 import coloredlogs, logging
 from decouple import config
-from get_data import (
-    get_gdp_data,
-    get_population_data,
-    get_gdp_per_capita,
-    get_government_debt,
-    get_consumer_price_index,
-    get_gdp_growth_rate,
-    get_population_growth_rate,
-    get_labour_force_participation_rate,
-    get_unemployment_rate,
-    get_trade_balance,
-    get_exports,
-    get_imports,
-    get_birth_rate,
-    get_death_rate,
-    get_life_expectancy
-)
+from metrics import METRICS, METRICS_BY_LABEL, CORE_METRICS
+from get_data import get_metric_data, get_indexed_metric, get_panel, prefetch_likely_metrics, serving_data_dir, DataNotReady
+from query import select_countries, max_year_in_range, ranked_rows
+from figure_cache import FigureCache, figure_key
+from charts import category_orders_for, line_figure, bar_figure, pie_figure, scatter_figure
+from frames import country_label, for_display, chart_values, kpi_text, kpi_with_delta
+from panel import select, latest_values, correlation
+import refresh
+import timing
+from timing import span
 logger = logging.getLogger(__name__)
 coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
 
@@ -35,14 +29,30 @@ st.set_page_config(
 # Declare some useful functions.
 
 @st.cache_data()
-def get_countries(df):
-    countries = list(COUNTRY_CODES_W_FLAGS.values())
+def get_countries(df, groups):
+    countries = list(COUNTRY_CODES_W_FLAGS)
     countries += [
         val for val in df['Country'].tolist()
-        if val not in countries
+        if val not in countries and val not in COUNTRY_GROUP_LABELS
     ]
     countries = [country for country in countries if country in df['Country'].unique().tolist()]
-    return countries
+    return countries + [group for group in COUNTRY_GROUP_LABELS if group in groups]
+
+@st.cache_resource
+def start_refresh_scheduler():
+    # one per server process, the first rerun starts it
+    return refresh.start_scheduler()
+
+def show_data_not_ready():
+    # never scrape inside a page load, a background refresh publishes the data
+    refresh.request_refresh()
+    st.info('⏳ The World Bank data is still being fetched, check back in a few minutes.')
+    st.stop()
+
+@st.cache_resource
+def get_figure_cache():
+    # shared by every session, most traffic lands on the same few selections
+    return FigureCache()
 
 def plot_metric_by_group(
         metric_df, 
@@ -50,61 +60,58 @@ def plot_metric_by_group(
         metric_col,
         bar_chart=True,
         text_col=None,
-        tickformat=None
+        tickformat=None,
+        ranked_df=None,
+        cache_key=None,
+        data_version=None
     ):
     col1, col2 = st.columns(2)
-    bar_metric_df = metric_df[metric_df[metric_col].isnull() == False]
-    max_year = bar_metric_df['Year'].max()
-    bar_metric_df = bar_metric_df[
-        bar_metric_df['Year'] == max_year
-    ]
-    bar_metric_df = bar_metric_df.sort_values(by=metric_col, ascending=False)
-    category_order = ['CAN 🇨🇦'] + [ # put Canada first
-        val for val in
-        bar_metric_df[var_to_group_by_col].tolist()
-        if val != 'CAN 🇨🇦'
-    ]
-    category_orders={
-        var_to_group_by_col: category_order
-    }
+    if ranked_df is None:
+        bar_metric_df = metric_df[metric_df[metric_col].isnull() == False]
+        ranked_df = bar_metric_df[
+            bar_metric_df['Year'] == bar_metric_df['Year'].max()
+        ].sort_values(by=metric_col, ascending=False)
+    category_orders = category_orders_for(ranked_df, var_to_group_by_col)
+
+    def figure(chart, build):
+        if cache_key is None:
+            return build()
+        return get_figure_cache().get_or_build(figure_key(*cache_key, chart), data_version, build)
+
     with col1:
-        p = px.line(
-            metric_df,
-            x='Year',
-            y=metric_col,
-            color=var_to_group_by_col,
-            title=f'Yearly {metric_col} by {var_to_group_by_col}',
-            category_orders=category_orders,
-            hover_data=['Year', metric_col, var_to_group_by_col]
-        )
-        p.update_yaxes(tickformat=tickformat)
-        st.plotly_chart(p, use_container_width=True)
+        with span('figure line'):
+            p = figure('line', lambda: line_figure(
+                metric_df, var_to_group_by_col, metric_col, category_orders, tickformat=tickformat
+            ))
+        with span('plotly_chart line'):
+            st.plotly_chart(p, use_container_width=True)
     with col2:
-        if bar_chart:
-            p = px.bar(
-                bar_metric_df,
-                y=var_to_group_by_col,
-                x=metric_col,
-                orientation='h',
-                title=f'{metric_col} by {var_to_group_by_col} (Year = {int(max_year)})',
-                hover_data={text_col: False, var_to_group_by_col: True, metric_col: True},
-                category_orders=category_orders,
-                text=text_col
-            )
-            p.update_xaxes(tickformat=tickformat)
-        else:
-            p = px.pie(
-                bar_metric_df,
-                names=var_to_group_by_col,
-                values=metric_col,
-                title=f'{metric_col} by {var_to_group_by_col} (Year = {int(max_year)})',
-                hole=0.4,
-                category_orders=category_orders,
-                hover_data={text_col: False, var_to_group_by_col: True, metric_col: True},
-            )
-        st.plotly_chart(p, use_container_width=True)
+        chart = 'bar' if bar_chart else 'pie'
+        with span(f'figure {chart}'):
+            if bar_chart:
+                p = figure('bar', lambda: bar_figure(
+                    ranked_df, var_to_group_by_col, metric_col, category_orders,
+                    text_col=text_col, tickformat=tickformat
+                ))
+            else:
+                p = figure('pie', lambda: pie_figure(
+                    ranked_df, var_to_group_by_col, metric_col, category_orders, text_col=text_col
+                ))
+        with span(f'plotly_chart {chart}'):
+            st.plotly_chart(p, use_container_width=True)
         return category_orders
 
+def show_timing_panel(spans):
+    # opt-in with ?debug=timing, the same spans are logged as JSON either way
+    with st.sidebar.expander('⏱️ Rerun timings', expanded=True):
+        st.dataframe(
+            [{'span': '· ' * s['depth'] + s['name'], 'start (ms)': s['start_ms'], 'duration (ms)': s['duration_ms']} for s in spans],
+            hide_index=True,
+            use_container_width=True
+        )
+        stats = get_figure_cache().stats()
+        st.caption(f"Figure cache: {stats['hits']} hits, {stats['misses']} misses, {stats['size']} entries")
+
 def show_metric(
         df, 
         y_col, 
@@ -112,33 +119,23 @@ def show_metric(
         delta_color='normal', 
         title=None, 
         help=None, 
-        calc_per_change=True
+        calc_per_change=True,
+        decimals=None
     ):
         if title is None:
             title = y_col
-        if calc_per_change:
-            try:
-                percentage_change = (
-                    100 * ((df[y_col].iloc[0] / df[y_col].iloc[1]) - 1)
-                )
-                delta='{change}% (YoY)'.format(
-                    change=round(percentage_change, 2)
-                )
-            except Exception as err:
-                print('❌' + str(err))
-                delta = None
-        else: 
-            delta = None
+        value, delta = kpi_with_delta(df[y_col], format_str, decimals, calc_per_change)
         st.metric(
             title,
-            value=format_str.format(df[y_col].iloc[0]),
+            value=value,
             delta=delta,
             delta_color=delta_color,
             help=help
         )
 
 def create_section_for_metric(
-        metric_df,
+        indexed_metric,
+        metric,
         selected_countries,
         to_year,
         from_year,
@@ -150,61 +147,117 @@ def create_section_for_metric(
         metric_delta_color='normal',
         chart_tick_format='$.2s'
 ):
-    filtered_metric_df = metric_df[
-        (metric_df['Country'].isin(selected_countries))
-        & (metric_df['Year'] <= to_year)
-        & (from_year <= metric_df['Year'])
-    ]
-    max_year_filtered_df = filtered_metric_df[
-        filtered_metric_df['Year'] == filtered_metric_df['Year'].max()
-    ].sort_values(by=metric_col_name, ascending=False)
+    with span('filter'):
+        # sorted so the same selection in any order builds the same (cacheable) figures
+        filtered_metric_df, country_dfs = select_countries(
+            indexed_metric, sorted(selected_countries), from_year, to_year
+        )
+        max_year_filtered_df = ranked_rows(
+            indexed_metric, max_year_in_range(country_dfs), selected_countries
+        )
 
     st.header(section_title, divider='gray')
 
-    countries = ['CAN 🇨🇦'] + [
+    countries = ['CAN'] + [
         val for val in
         max_year_filtered_df['Country']
-        if val != 'CAN 🇨🇦'
+        if val != 'CAN'
     ]
-    cols = st.columns(len(selected_countries))
-    i = 0
-    for country in countries:
-        with cols[i]:
-            show_metric(
-                filtered_metric_df[filtered_metric_df['Country'] == country],
-                metric_col_name,
-                title=country,
-                format_str=format_metric_str,
-                delta_color=metric_delta_color,
-            )
-        i += 1
+    with span('kpis'):
+        cols = st.columns(len(selected_countries))
+        i = 0
+        for country in countries:
+            with cols[i]:
+                show_metric(
+                    country_dfs.get(country, filtered_metric_df.iloc[:0]),
+                    metric_col_name,
+                    title=country_label(country),
+                    format_str=format_metric_str,
+                    delta_color=metric_delta_color,
+                    decimals=METRICS[metric]['decimals'],
+                )
+            i += 1
+
+    with span('display'):
+        # flags and text columns for just the rows being plotted
+        filtered_metric_df = for_display(filtered_metric_df, metric, text=False)
+        max_year_filtered_df = for_display(max_year_filtered_df, metric)
+
+    with span('charts'):
+        plot_metric_by_group(
+            filtered_metric_df,
+            'Country',
+            bar_chart=True,
+            metric_col=chart_col_name,
+            text_col=text_col_name,
+            tickformat=chart_tick_format,
+            ranked_df=max_year_filtered_df,
+            cache_key=(metric, selected_countries, from_year, to_year),
+            data_version=indexed_metric.version
+        )
 
-    plot_metric_by_group(
-        filtered_metric_df,
-        'Country',
-        bar_chart=True,
-        metric_col=chart_col_name,
-        text_col=text_col_name,
-        tickformat=chart_tick_format
-    )
+def create_comparison_section(panel, x_metric, y_metric, selected_countries, from_year, to_year):
+    # every metric at once for the selected countries, read off the panel cube
+    with span('compare'):
+        countries = list(selected_countries)
+        cube, years = select(panel, countries, from_year=from_year, to_year=to_year)
+        x = chart_values(cube[..., panel.metrics.get_loc(x_metric)], x_metric)
+        y = chart_values(cube[..., panel.metrics.get_loc(y_metric)], y_metric)
+        x_col, y_col = METRICS[x_metric]['name'], METRICS[y_metric]['name']
+        rows, cols = np.nonzero(np.isfinite(x) & np.isfinite(y))
+        scatter_df = pd.DataFrame({
+            'Country': [country_label(country) for country in np.asarray(countries, dtype=object)[rows]],
+            'Year': years[cols],
+            x_col: x[rows, cols],
+            y_col: y[rows, cols],
+        })
+        latest, latest_years = latest_values(cube, years)
+        profile = pd.DataFrame(
+            [
+                [
+                    f'{kpi_text(latest[i, j], metric)} ({latest_years[i, j]})' if latest_years[i, j] >= 0 else '–'
+                    for i in range(len(countries))
+                ]
+                for j, metric in enumerate(panel.metrics)
+            ],
+            index=[METRICS[metric]['label'] for metric in panel.metrics],
+            columns=[country_label(country) for country in countries]
+        )
+
+    with span('figure scatter'):
+        p = get_figure_cache().get_or_build(
+            figure_key(f'{x_metric}|{y_metric}', selected_countries, from_year, to_year, 'scatter'),
+            panel.version,
+            lambda: scatter_figure(
+                scatter_df, x_col, y_col, category_orders_for(scatter_df),
+                x_tickformat=METRICS[x_metric]['tick_format'], y_tickformat=METRICS[y_metric]['tick_format']
+            )
+        )
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(p, use_container_width=True)
+        r = correlation(x, y)
+        if r is not None:
+            st.caption(f'Correlation across the selected countries and years: r = {r:.2f}')
+    with col2:
+        st.caption(f'Latest value up to {to_year} (and the year it is from)')
+        st.dataframe(profile, use_container_width=True)
 
 # -----------------------------------------------------------------------------
 # Load the data.
-gdp_df = get_gdp_data()
-population_df = get_population_data()
-gdp_per_capita_df = get_gdp_per_capita()
-government_debt_df = get_government_debt()
-consumer_price_index_df = get_consumer_price_index()
-gdp_growth_rate_df = get_gdp_growth_rate()
-population_growth_rate_df = get_population_growth_rate()
-labour_force_participation_rate_df = get_labour_force_participation_rate()
-unemployment_rate_df = get_unemployment_rate()
-trade_balance_df = get_trade_balance()
-exports_df = get_exports()
-imports_df = get_imports()
-birth_rate_df = get_birth_rate()
-death_rate_df = get_death_rate()
-life_expectancy_df = get_life_expectancy()
+show_timings = st.query_params.get('debug') == 'timing'
+timing.start_rerun(enabled=timing.TIMING_SPANS or show_timings)
+
+# Only GDP up front (it drives the year slider and country list), the selected
+# metric is loaded once it's picked below.
+if refresh.REFRESH_INTERVAL_HOURS > 0:
+    start_refresh_scheduler()
+data_dir = serving_data_dir()
+with span('get_metric_data gdp'):
+    try:
+        gdp_df = get_metric_data('gdp', data_dir)
+    except DataNotReady:
+        show_data_not_ready()
 
 # -----------------------------------------------------------------------------
 # Setup the dashboard.
@@ -216,8 +269,8 @@ st.caption('This dashboard compares key economic indicators for Canada against o
 
 # -----------------------------------------------------------------------------
 # Filters.
-min_value = gdp_df['Year'].min()
-max_value = gdp_df['Year'].max()
+min_value = int(gdp_df['Year'].min())
+max_value = int(gdp_df['Year'].max())
 
 
 from_year, to_year = st.sidebar.slider(
@@ -228,269 +281,95 @@ from_year, to_year = st.sidebar.slider(
 )
 st.sidebar.caption("Want to say thanks? \n[Buy me a coffee ☕](https://www.buymeacoffee.com/brydon)")
 
-gdp_df_max_year = gdp_df[gdp_df['Year'] == to_year].sort_values(by='GDP', ascending=False)
-countries = get_countries(gdp_df_max_year)
-
-if not len(countries):
-    st.warning("Select at least one country")
-
 col1, col2 = st.columns(2)
 
 with col1:
     metric = st.selectbox(
         'Metric',
-        [   
-            'GDP / Capita 💰',
-            'GDP 💰', 
-            'Population 👥',
-            'Government Debt 💳',
-            'Consumer Price Index 🛒',
-            'GDP Growth Rate 📈',
-            'Population Growth Rate 📈',
-            'Labour Force Participation Rate 💼',
-            'Unemployment Rate 🛋️',
-            'Exports ➡️',
-            'Imports ⬅️',
-            'Trade Balance 📦',
-            'Birth Rate 🍼',
-            'Death Rate 💀',
-            'Life Expectancy 🎂'
-        ],
-    )
-
-with col2:
-    selected_countries = st.multiselect(
-        'Select Countries',
-        countries,
-        default=['CAN 🇨🇦', 'USA 🇺🇸']
+        list(METRICS_BY_LABEL),
     )
 
 # -----------------------------------------------------------------------------
 # Show the data.
 
-if metric == 'GDP / Capita 💰':
-    create_section_for_metric(
-        metric_df=gdp_per_capita_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Annual GDP per Capita',
-        metric_col_name='GDP per Capita (k-int)',
-        chart_col_name='GDP per Capita',
-        text_col_name='GDP per Capita (k)',
-        format_metric_str='${:,.0f}k',
-        metric_delta_color='normal',
-        chart_tick_format='$.2s'
-    )
-
-elif metric == 'GDP 💰':
-    create_section_for_metric(
-        metric_df=gdp_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Annual GDP',
-        metric_col_name='GDP (T-int)',
-        chart_col_name='GDP',
-        text_col_name='GDP (T)',
-        format_metric_str='${:,.1f}T',
-        metric_delta_color='normal',
-        chart_tick_format='$.2s'
-    )
-
-elif metric == 'Population 👥':
-    create_section_for_metric(
-        metric_df=population_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Population',
-        metric_col_name='Population (M-int)',
-        chart_col_name='Population',
-        text_col_name='Population (M)',
-        format_metric_str='{:,.1f}M',
-        metric_delta_color='normal',
-        chart_tick_format=None
-    )
-
-elif metric == 'Government Debt 💳':
-    create_section_for_metric(
-        metric_df=government_debt_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Government Debt vs GDP',
-        metric_col_name='Government Debt vs GDP (%)',
-        chart_col_name='Government Debt vs GDP',
-        text_col_name='Government Debt vs GDP (%-str)',
-        format_metric_str='{:.0f}%',
-        metric_delta_color='inverse',
-        chart_tick_format=".0%"
-    )
-
-elif metric == 'Consumer Price Index 🛒':
-    create_section_for_metric(
-        metric_df=consumer_price_index_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Consumer Price Index (vs 2010)',
-        metric_col_name='Consumer Price Index (%)',
-        chart_col_name='Consumer Price Index',
-        text_col_name='Consumer Price Index (%-str)',
-        format_metric_str='{:.0f}%',
-        metric_delta_color='inverse',
-        chart_tick_format=".0%"
-    )
-
-elif metric == 'GDP Growth Rate 📈':
-    create_section_for_metric(
-        metric_df=gdp_growth_rate_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='GDP Growth Rate',
-        metric_col_name='GDP Growth Rate (%)',
-        chart_col_name='GDP Growth Rate',
-        text_col_name='GDP Growth Rate (%-str)',
-        format_metric_str='{:.1f}%',
-        metric_delta_color='normal',
-        chart_tick_format=".1%"
-    )
-
-elif metric == 'Population Growth Rate 📈':
-    create_section_for_metric(
-        metric_df=population_growth_rate_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Population Growth Rate',
-        metric_col_name='Population Growth Rate (%)',
-        chart_col_name='Population Growth Rate',
-        text_col_name='Population Growth Rate (%-str)',
-        format_metric_str='{:.1f}%',
-        metric_delta_color='normal',
-        chart_tick_format=".1%"
-    )
-
-elif metric == 'Labour Force Participation Rate 💼':
-    create_section_for_metric(
-        metric_df=labour_force_participation_rate_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Labour Force Participation Rate',
-        metric_col_name='Labour Force Participation Rate (%)',
-        chart_col_name='Labour Force Participation Rate',
-        text_col_name='Labour Force Participation Rate (%-str)',
-        format_metric_str='{:.1f}%',
-        metric_delta_color='normal',
-        chart_tick_format=".1%"
-    )
+metric_key = METRICS_BY_LABEL[metric]
+metric_spec = METRICS[metric_key]
+with span(f'get_indexed_metric {metric_key}'):
+    try:
+        if metric_spec.get('on_demand'):
+            # fetched from the World Bank the first time anybody opens it
+            with st.spinner(f"Getting {metric_spec['name']} from the World Bank..."):
+                indexed_metric = get_indexed_metric(metric_key, data_dir)
+        else:
+            indexed_metric = get_indexed_metric(metric_key, data_dir)
+    except DataNotReady:
+        if metric_spec.get('on_demand'):
+            st.warning(f"🤷 The World Bank doesn't have {metric_spec['name']} data for these countries.")
+            st.stop()
+        show_data_not_ready()
+
+with span('countries'):
+    gdp_df_max_year = gdp_df[gdp_df['Year'] == to_year].sort_values(by='GDP', ascending=False)
+    # only the groups the selected metric has a value for in the year shown,
+    # the others would chart nothing
+    groups = set(ranked_rows(indexed_metric, to_year, list(COUNTRY_GROUP_LABELS))['Country'])
+    countries = get_countries(gdp_df_max_year, groups)
 
-elif metric == 'Unemployment Rate 🛋️':
-    create_section_for_metric(
-        metric_df=unemployment_rate_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Unemployment Rate',
-        metric_col_name='Unemployment Rate (%)',
-        chart_col_name='Unemployment Rate',
-        text_col_name='Unemployment Rate (%-str)',
-        format_metric_str='{:.1f}%',
-        metric_delta_color='inverse',
-        chart_tick_format=".1%"
-    )
+if not len(countries):
+    st.warning("Select at least one country")
 
-elif metric == 'Exports ➡️':
-    create_section_for_metric(
-        metric_df=exports_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Exports',
-        metric_col_name='Exports (T-int)',
-        chart_col_name='Exports',
-        text_col_name='Exports (T)',
-        format_metric_str='${:,.2f}T',
-        metric_delta_color='normal',
-        chart_tick_format='$.3s'
+with col2:
+    # the picks carry over to the next metric, less any group it doesn't have
+    st.session_state['selected_countries'] = [
+        country for country in st.session_state.get('selected_countries', DEFAULT_COUNTRIES)
+        if country in countries
+    ]
+    selected_countries = st.multiselect(
+        'Select Countries',
+        countries,
+        format_func=country_label,
+        key='selected_countries'
     )
 
-elif metric == 'Imports ⬅️':
-    create_section_for_metric(
-        metric_df=imports_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Imports',
-        metric_col_name='Imports (T-int)',
-        chart_col_name='Imports',
-        text_col_name='Imports (T)',
-        format_metric_str='${:,.2f}T',
-        metric_delta_color='normal',
-        chart_tick_format='$.3s'
-    )
+create_section_for_metric(
+    indexed_metric=indexed_metric,
+    metric=metric_key,
+    selected_countries=selected_countries,
+    to_year=to_year,
+    from_year=from_year,
+    section_title=metric_spec['section_title'],
+    metric_col_name=metric_spec['kpi_col'],
+    chart_col_name=metric_spec['name'],
+    text_col_name=metric_spec['text_col'] or metric_spec['name'],
+    format_metric_str=metric_spec['format'],
+    metric_delta_color=metric_spec['delta_color'],
+    chart_tick_format=metric_spec['tick_format']
+)
 
-elif metric == 'Trade Balance 📦':
-    create_section_for_metric(
-        metric_df=trade_balance_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Trade Balance (% of GDP)',
-        metric_col_name='Trade Balance (%)',
-        chart_col_name='Trade Balance',
-        text_col_name='Trade Balance (%-str)',
-        format_metric_str='{:.1f}%',
-        metric_delta_color='normal',
-        chart_tick_format=".1%"
-    )
+# -----------------------------------------------------------------------------
+# Compare metrics.
 
-elif metric == 'Birth Rate 🍼':
-    create_section_for_metric(
-        metric_df=birth_rate_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Birth Rate (per 1,000 people)',
-        metric_col_name='Birth Rate',
-        chart_col_name='Birth Rate',
-        text_col_name='Birth Rate',
-        format_metric_str='{:.1f}',
-        metric_delta_color='normal',
-        chart_tick_format=".1f"
-    )
+st.header('Compare Metrics', divider='gray')
+# the panel reads every core metric, so it's only built once somebody asks for it
+if st.toggle('Compare two metrics across the selected countries'):
+    compare_labels = [METRICS[key]['label'] for key in CORE_METRICS]
+    col1, col2 = st.columns(2)
+    with col1:
+        x_label = st.selectbox('X axis', compare_labels, index=CORE_METRICS.index('gdp_per_capita'))
+    with col2:
+        y_label = st.selectbox('Y axis', compare_labels, index=CORE_METRICS.index('life_expectancy'))
+    if selected_countries:
+        with span('get_panel'):
+            panel = get_panel(data_dir)
+        create_comparison_section(
+            panel, METRICS_BY_LABEL[x_label], METRICS_BY_LABEL[y_label], selected_countries, from_year, to_year
+        )
 
-elif metric == 'Death Rate 💀':
-    create_section_for_metric(
-        metric_df=death_rate_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Death Rate (per 1,000 people)',
-        metric_col_name='Death Rate',
-        chart_col_name='Death Rate',
-        text_col_name='Death Rate',
-        format_metric_str='{:.1f}',
-        metric_delta_color='normal',
-        chart_tick_format=".1f"
-    )
+st.caption('Data from the [World Bank Open Data](https://data.worldbank.org/) API.')
 
-elif metric == 'Life Expectancy 🎂':
-    create_section_for_metric(
-        metric_df=life_expectancy_df,
-        selected_countries=selected_countries,
-        to_year=to_year,
-        from_year=from_year,
-        section_title='Life Expectancy',
-        metric_col_name='Life Expectancy',
-        chart_col_name='Life Expectancy',
-        text_col_name='Life Expectancy',
-        format_metric_str='{:.1f}',
-        metric_delta_color='normal',
-        chart_tick_format=".1f"
-    )
+# Warm the metrics this user is likely to pick next while they read the page.
+prefetch_likely_metrics(metric_key, data_dir)
 
-st.caption('Data from the [World Bank Open Data](https://data.worldbank.org/) API.')
\ No newline at end of file
+spans = timing.finish_rerun(metric=metric_key, countries=len(selected_countries), from_year=int(from_year), to_year=int(to_year))
+if show_timings:
+    show_timing_panel(spans)
\ No newline at end of file
@@ -0,0 +1,55 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# Named timing spans collected per rerun. Streamlit runs each session's script
+# on its own thread, so spans live in a thread-local list. While collection is
+# off span() hands back one shared no-op context, cheap enough to leave the
+# spans in the code permanently.
+TIMING_SPANS = config('TIMING_SPANS', default=False, cast=bool)
+
+_local = threading.local()
+_NOOP = nullcontext()
+
+def start_rerun(enabled=TIMING_SPANS):
+    _local.spans = [] if enabled else None
+    _local.depth = 0
+    _local.started = time.perf_counter()
+
+def span(name):
+    spans = getattr(_local, 'spans', None)
+    if spans is None:
+        return _NOOP
+    return _timed_span(spans, name)
+
+@contextmanager
+def _timed_span(spans, name):
+    start = time.perf_counter()
+    record = {
+        'name': name,
+        'depth': _local.depth,
+        'start_ms': round((start - _local.started) * 1e3, 3),
+        'duration_ms': None,
+    }
+    # appended on entry so nested spans come out in call order
+    spans.append(record)
+    _local.depth += 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+        record['duration_ms'] = round((time.perf_counter() - start) * 1e3, 3)
+
+def finish_rerun(**context):
+    spans = getattr(_local, 'spans', None)
+    _local.spans = None
+    if spans is None:
+        return None
+    total_ms = round((time.perf_counter() - _local.started) * 1e3, 3)
+    logger.info(json.dumps({'event': 'rerun_timing', 'total_ms': total_ms, **context, 'spans': spans}, ensure_ascii=False))
+    return spans
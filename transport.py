@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import re
+import requests
+from requests.structures import CaseInsensitiveDict
+import coloredlogs, logging
+from decouple import config
+logger = logging.getLogger(__name__)
+coloredlogs.install(level=config('LOG_LEVEL', 'INFO'))
+
+# How the scraper reaches the World Bank API:
+#   live   - straight to the API
+#   record - to the API, saving every response under CASSETTE_DIR
+#   replay - only from CASSETTE_DIR, nothing goes over the network
+# WORLDBANK_BASE_URL points live/record traffic somewhere else, e.g. a local
+# `python -m benchmarks.worldbank_stub` on an air-gapped machine.
+WORLDBANK_URL = 'https://api.worldbank.org'
+SCRAPE_TRANSPORT = config('SCRAPE_TRANSPORT', default='live')
+CASSETTE_DIR = config('CASSETTE_DIR', default='./cassettes')
+WORLDBANK_BASE_URL = config('WORLDBANK_BASE_URL', default=WORLDBANK_URL)
+TRANSPORT_MODES = ('live', 'record', 'replay')
+
+# the response headers worth keeping, the rest vary per request
+RECORDED_HEADERS = ('Content-Type', 'Retry-After')
+
+def request_url(url, params=None):
+    # one canonical url per request, query params included
+    return requests.Request('GET', url, params=params).prepare().url
+
+def cassette_path(url, cassette_dir=CASSETTE_DIR):
+    digest = hashlib.sha256(url.encode()).hexdigest()[:24]
+    return f'{cassette_dir}/{digest}.json'
+
+def rebase(url, base_url):
+    if base_url == WORLDBANK_URL:
+        return url
+    # the constants mix http:// and https:// for the same host
+    return re.sub(r'^https?://api\.worldbank\.org', base_url.rstrip('/'), url)
+
+def record_response(url, response, cassette_dir=CASSETTE_DIR):
+    entry = {
+        'url': url,
+        'status': response.status_code,
+        'reason': response.reason,
+        'headers': {key: response.headers[key] for key in RECORDED_HEADERS if key in response.headers},
+    }
+    try:
+        # kept as parsed json so the [meta, rows] pages stay readable on disk
+        entry['json'] = response.json()
+    except ValueError:
+        entry['text'] = response.text
+    path = cassette_path(url, cassette_dir)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(entry, f)
+    os.replace(f'{path}.tmp', path)
+
+def replay_response(url, cassette_dir=CASSETTE_DIR) -> requests.Response:
+    response = requests.Response()
+    response.url = url
+    response.encoding = 'utf-8'
+    path = cassette_path(url, cassette_dir)
+    if not os.path.exists(path):
+        # surfaces through raise_for_status like any other failed request
+        logger.warning(f'No recording for {url} 📼')
+        response.status_code = 404
+        response.reason = 'Not Recorded'
+        response._content = b''
+        return response
+    with open(path) as f:
+        entry = json.load(f)
+    response.status_code = entry['status']
+    response.reason = entry.get('reason')
+    response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+    if 'json' in entry:
+        response._content = json.dumps(entry['json']).encode()
+    else:
+        response._content = entry.get('text', '').encode()
+    return response
+
+class TransportSession:
+    # Drop-in for the requests.Session the scraper passes around, it only needs get()
+    def __init__(self, session=None, mode=SCRAPE_TRANSPORT, cassette_dir=CASSETTE_DIR, base_url=WORLDBANK_BASE_URL):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f'Unknown transport {mode!r}, expected one of {TRANSPORT_MODES}')
+        self.session = session if session is not None else requests.Session()
+        self.mode = mode
+        self.cassette_dir = cassette_dir
+        self.base_url = base_url
+        if mode == 'record':
+            os.makedirs(cassette_dir, exist_ok=True)
+
+    def get(self, url, params=None, **kwargs):
+        url = request_url(url, params)
+        if self.mode == 'replay':
+            return replay_response(url, self.cassette_dir)
+        response = self.session.get(rebase(url, self.base_url), **kwargs)
+        if self.mode == 'record':
+            record_response(url, response, self.cassette_dir)
+        return response
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()